@@ -10,13 +10,23 @@ Versão: 2.0 (Clean Code Refactor)
 
 import streamlit as st
 import os
+import queue
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 # Local Modules
-from settings import ALL_NICHES, GROUPS_DEFINITION, get_cluster_from_niche
-from utils import save_uploaded_file, validate_email, save_to_jsonl, save_to_excel_db
+from taxonomy import get_taxonomy
+from utils import save_uploaded_files, validate_general_data
 from form_logic import render_cluster_questions
+from persistence import get_persistence_service
+from dedup import find_duplicates
+from metrics import timed, profiled, start_exporters
+from upload_spool import spooled_file_uploader, get_spooled, release_session_spool
+from pdf_ingest import enqueue_submission, start_ingest_worker
+
+# Segundos de espera pelas confirmações do writer de persistência
+STORE_ACK_TIMEOUT = 30.0
 
 # --- SETUP & CONFIG ---
 st.set_page_config(
@@ -25,12 +35,31 @@ st.set_page_config(
     page_icon="🚀"
 )
 
-def load_css() -> None:
-    """Carrega estilos CSS personalizados."""
+# --- STATIC ASSETS (lidos uma vez por processo, não a cada rerun) ---
+@st.cache_resource
+def get_css() -> Optional[str]:
+    """Lê styles.css uma única vez por processo."""
     css_file = "styles.css"
     if os.path.exists(css_file):
         with open(css_file) as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+            return f.read()
+    return None
+
+@st.cache_resource
+def get_logo() -> Optional[bytes]:
+    """Localiza e lê o primeiro logo disponível uma única vez por processo."""
+    logo_files = ["bmed.png", "bmed slogan.jfif", "bmed_logo.png"]
+    for logo in logo_files:
+        if os.path.exists(logo):
+            with open(logo, "rb") as f:
+                return f.read()
+    return None
+
+def load_css() -> None:
+    """Carrega estilos CSS personalizados."""
+    css = get_css()
+    if css:
+        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 
 def init_session_state() -> None:
     """Inicializa variáveis de estado para persistência."""
@@ -39,7 +68,17 @@ def init_session_state() -> None:
     
     # Defaults para evitar ValueError em widgets
     if 'niche' not in st.session_state:
-        st.session_state.niche = ALL_NICHES[0]
+        st.session_state.niche = get_taxonomy().all_niches[0]
+
+    # A recarga da taxonomia pode remover o nicho/grupo escolhido. Só a Etapa 1
+    # (ainda não confirmada) acompanha a revisão atual; depois disso a sessão
+    # fica presa a taxonomy_revision e seus dados não mudam.
+    if st.session_state.step == 1:
+        taxonomy = get_taxonomy()
+        if st.session_state.niche not in taxonomy.all_niches:
+            st.session_state.niche = taxonomy.all_niches[0]
+        if st.session_state.get('manual_cluster') not in ("", None, *taxonomy.clusters):
+            st.session_state.manual_cluster = ""
 
     # Campos de formulário persistentes
     form_keys = [
@@ -53,19 +92,20 @@ def init_session_state() -> None:
     if 'start_date' not in st.session_state:
         st.session_state.start_date = datetime.today()
 
+    # Streamlit descarta o estado de widgets não renderizados, então os dados
+    # da Etapa 1 sumiriam na Etapa 2. Reatribuir as chaves os preserva.
+    for k in form_keys + ['niche', 'start_date']:
+        st.session_state[k] = st.session_state[k]
+
 def render_header() -> None:
     """Renderiza o cabeçalho e logo da aplicação."""
-    logo_files = ["bmed.png", "bmed slogan.jfif", "bmed_logo.png"]
+    logo = get_logo()
     
     col1, col2, col_r = st.columns([1, 2, 1])
     with col2:
-        logo_found = False
-        for logo in logo_files:
-            if os.path.exists(logo):
-                st.image(logo, use_column_width=True)
-                logo_found = True
-                break
-        if not logo_found:
+        if logo:
+            st.image(logo, width="stretch")
+        else:
              st.markdown("<div style='text-align: center; font-size: 3em;'>🚀</div>", unsafe_allow_html=True)
     
     st.markdown("<h2 style='text-align: center;'>Portal de Submissão de Startups</h2>", unsafe_allow_html=True)
@@ -94,10 +134,11 @@ def process_step_1() -> None:
         st.subheader("2. Categorização")
         st.info("Selecione onde sua solução melhor se encaixa.")
         
-        st.selectbox("Qual o nicho da sua solução?", ALL_NICHES, key="niche")
+        taxonomy = get_taxonomy()
+        st.selectbox("Qual o nicho da sua solução?", taxonomy.all_niches, key="niche")
         
         st.markdown("**Se não encontrou seu nicho:**")
-        st.selectbox("Selecione o Grupo Macro (caso 'Nicho não listado'):", [""] + list(GROUPS_DEFINITION.keys()), key="manual_cluster")
+        st.selectbox(f"Selecione o Grupo Macro (caso '{taxonomy.unlisted_niche}'):", [""] + list(taxonomy.clusters), key="manual_cluster")
 
         st.text_area("Descreva sua solução em poucas palavras (Elevator Pitch):", height=100, key="description")
         
@@ -106,36 +147,75 @@ def process_step_1() -> None:
 
 def validate_step_1() -> None:
     """Valida os dados da Etapa 1 e avança se estiver ok."""
-    errors = []
-    
-    # Validations
-    if not st.session_state.startup_name:
-        errors.append("Nome da Startup é obrigatório.")
-    if not st.session_state.email:
-        errors.append("E-mail é obrigatório.")
-    elif not validate_email(st.session_state.email):
-        errors.append("E-mail com formato inválido.")
-    if not st.session_state.niche:
-        errors.append("Nicho é obrigatório.")
-    
-    # Cluster Logic
-    final_cluster = None
-    if st.session_state.niche == "Nicho não listado":
-        if not st.session_state.manual_cluster:
-            errors.append("Selecione o Grupo Macro para nicho não listado.")
-        else:
-            final_cluster = st.session_state.manual_cluster
-    else:
-        final_cluster = get_cluster_from_niche(st.session_state.niche)
+    # Mesmas regras da importação em lote (utils.validate_general_data)
+    taxonomy = get_taxonomy()
+    errors, final_cluster = validate_general_data({
+        "startup_name": st.session_state.startup_name,
+        "email": st.session_state.email,
+        "niche": st.session_state.niche,
+        "cluster_macro": st.session_state.manual_cluster,
+    })
     
     if errors:
         for err in errors:
             st.error(err)
     else:
         st.session_state.target_cluster = final_cluster
+        st.session_state.taxonomy_revision = taxonomy.revision
+        st.session_state.duplicate_matches = find_duplicates(
+            st.session_state.startup_name, st.session_state.product_name,
+            st.session_state.cnpj, st.session_state.email
+        )
         st.session_state.step = 2
         st.rerun()
 
+def render_duplicate_warning() -> None:
+    """Avisa quando a Etapa 1 se parece com submissões já registradas."""
+    matches = st.session_state.get('duplicate_matches') or []
+    if not matches:
+        return
+    lines = "\n".join(
+        f"- **{m.startup_name}** ({m.product_name or '—'}) · {m.reason} · similaridade {m.score:.0%}"
+        for m in matches
+    )
+    st.warning(
+        "Encontramos submissões semelhantes já registradas. "
+        "Se for uma atualização, pode prosseguir normalmente.\n\n" + lines
+    )
+
+@st.fragment
+def render_general_tech() -> None:
+    """Seção 3 como fragmento: interações reexecutam só este bloco."""
+    with st.expander("3. Checklist Técnico & Regulatório (Geral)", expanded=True):
+        col_tech1, col_tech2 = st.columns(2)
+        with col_tech1:
+            st.selectbox("Status na ANVISA:", 
+                ["Não se aplica", "Em processo", "Aprovado (Com Registro)", "Isento"], key="tech_anvisa_status")
+            st.text_input("Nº Registro ANVISA (se houver):", key="tech_anvisa_num")
+        with col_tech2:
+            st.checkbox("Estamos adequados à LGPD?", key="tech_lgpd")
+            st.checkbox("Dados hospedados em Nuvem Segura?", help="AWS, Azure, etc.", key="tech_cloud")
+            st.checkbox("Possui Certificação ISO 27001 ou SBIS?", key="tech_iso")
+
+@st.fragment
+def render_cluster_fragment() -> None:
+    """Seção 4 como fragmento: campos condicionais (DOI/PDF, profissional) reagem sem rerun da página."""
+    st.session_state.specific_data = render_cluster_questions(
+        st.session_state.target_cluster, st.session_state.get('taxonomy_revision')
+    )
+
+@st.fragment
+def render_uploads() -> None:
+    """Seção 5: anexos vão para o spool em disco assim que chegam."""
+    with st.expander("5. Anexo de Documentos Gerais", expanded=True):
+        col_up1, col_up2 = st.columns(2)
+        with col_up1:
+            spooled_file_uploader("📂 Pitch Deck / Institucional", "doc_deck", type=["pdf", "pptx"])
+            spooled_file_uploader("📂 Manual do Usuário", "doc_manual", type=["pdf"])
+        with col_up2:
+            spooled_file_uploader("📂 Comprovante ANVISA", "doc_anvisa", type=["pdf", "jpg", "png"])
+            spooled_file_uploader("📂 Evidência Científica", "doc_science", type=["pdf"])
+
 def process_step_2() -> None:
     """Renderiza e processa a Etapa 2 (Questões Específicas e Uploads)."""
     
@@ -147,42 +227,31 @@ def process_step_2() -> None:
             st.session_state.step = 1
             st.rerun()
 
+    render_duplicate_warning()
     st.info(f"📋 Preenchendo ficha técnica para: **{st.session_state.target_cluster}**")
     
-    with st.form("final_submission_form"):
-        # Section 3: General Tech
-        with st.expander("3. Checklist Técnico & Regulatório (Geral)", expanded=True):
-            col_tech1, col_tech2 = st.columns(2)
-            with col_tech1:
-                anvisa_status = st.selectbox("Status na ANVISA:", 
-                    ["Não se aplica", "Em processo", "Aprovado (Com Registro)", "Isento"])
-                anvisa_num = st.text_input("Nº Registro ANVISA (se houver):")
-            with col_tech2:
-                lgpd = st.checkbox("Estamos adequados à LGPD?")
-                cloud = st.checkbox("Dados hospedados em Nuvem Segura?", help="AWS, Azure, etc.")
-                iso = st.checkbox("Possui Certificação ISO 27001 ou SBIS?")
-
-        # Section 4: Specific Cluster Questions
-        specific_data = render_cluster_questions(st.session_state.target_cluster)
-
-        # Section 5: Uploads
-        st.markdown("---")
-        with st.expander("5. Anexo de Documentos Gerais", expanded=True):
-            col_up1, col_up2 = st.columns(2)
-            with col_up1:
-                doc_deck = st.file_uploader("📂 Pitch Deck / Institucional", type=["pdf", "pptx"])
-                doc_manual = st.file_uploader("📂 Manual do Usuário", type=["pdf"])
-            with col_up2:
-                doc_anvisa = st.file_uploader("📂 Comprovante ANVISA", type=["pdf", "jpg", "png"])
-                doc_science = st.file_uploader("📂 Evidência Científica", type=["pdf"])
+    # Sections 3 and 4 rerun independently (fragments); values live in session_state
+    render_general_tech()
+    render_cluster_fragment()
 
-        st.markdown("---")
-        if st.form_submit_button("✅ Enviar Submissão Completa", type="primary"):
-            handle_final_submission(
-                anvisa_status, anvisa_num, lgpd, cloud, iso,
-                specific_data,
-                doc_deck, doc_manual, doc_anvisa, doc_science
-            )
+    # Section 5: Uploads (spooled to disk; only handles stay in session_state)
+    st.markdown("---")
+    render_uploads()
+
+    st.markdown("---")
+    if st.button("✅ Enviar Submissão Completa", type="primary"):
+        handle_final_submission(
+            st.session_state.tech_anvisa_status, st.session_state.tech_anvisa_num,
+            st.session_state.tech_lgpd, st.session_state.tech_cloud, st.session_state.tech_iso,
+            dict(st.session_state.specific_data),
+            get_spooled("doc_deck"), get_spooled("doc_manual"),
+            get_spooled("doc_anvisa"), get_spooled("doc_science")
+        )
+
+    if st.session_state.get('submission_done'):
+        if st.button("Nova Submissão"):
+            st.session_state.clear()
+            st.rerun()
 
 def handle_final_submission(
     anvisa_status, anvisa_num, lgpd, cloud, iso,
@@ -192,21 +261,26 @@ def handle_final_submission(
     """Processa a submissão final, salvando arquivos e dados."""
     
     # 1. Prepare Directory
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    clean_name = st.session_state.startup_name.replace(" ", "_").lower()
-    folder_name = f"Submissoes/{clean_name}_{timestamp}"
-    
-    # 2. Save Global Files
-    save_uploaded_file(doc_deck, folder_name)
-    save_uploaded_file(doc_manual, folder_name)
-    save_uploaded_file(doc_anvisa, folder_name)
-    save_uploaded_file(doc_science, folder_name)
+    with timed("prepare_directory"):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+        clean_name = st.session_state.startup_name.replace(" ", "_").lower()
+        folder_name = f"Submissoes/{clean_name}_{timestamp}"
+        os.makedirs(folder_name, exist_ok=True)
     
-    # 3. Save Specific File (if any) using key handling
-    if 'study_file' in specific_data and specific_data['study_file']:
-        save_uploaded_file(specific_data['study_file'], folder_name)
-        specific_data['study_file_name'] = specific_data['study_file'].name
-        # Remove UploadedFile object before saving to JSON/Excel
+    # 2. Save Global + Specific Files concurrently (all-or-nothing)
+    study_file = specific_data.get('study_file')
+    saved_files, upload_errors = save_uploaded_files(
+        [doc_deck, doc_manual, doc_anvisa, doc_science, study_file], folder_name
+    )
+    if upload_errors:
+        for file_name, err in upload_errors.items():
+            st.error(f"Erro ao salvar arquivo `{file_name}`: {err}")
+        st.warning("Nenhum dado foi registrado. Verifique os anexos e envie novamente.")
+        return
+
+    # 3. Keep only the name of the specific file (file handles can't go to JSON/Excel)
+    if study_file:
+        specific_data['study_file_name'] = study_file.name
         del specific_data['study_file']
 
     # 4. Compile Final Data Payload
@@ -235,28 +309,64 @@ def handle_final_submission(
         "specific_data": specific_data
     }
     
-    # 5. Persist Data
-    json_ok = save_to_jsonl(final_data)
-    excel_ok = save_to_excel_db(final_data)
+    # 5. Persist Data (write-behind: a single writer thread owns the files)
+    json_ok = persist_submission(final_data)
     
-    if json_ok and excel_ok:
+    if json_ok:
+        queue_ingestion(folder_name, list(saved_files.values()))
         st.balloons()
         st.success(f"✅ Sucesso! A startup **{st.session_state.startup_name}** foi registrada.")
         st.info(f"📂 Arquivos salvos em: `{folder_name}`")
-        if st.button("Nova Submissão"):
-            st.session_state.clear()
-            st.rerun()
+        st.session_state.submission_done = True
+        release_session_spool()
+
+def queue_ingestion(folder_name: str, file_paths: List[str]) -> None:
+    """Enfileira a extração dos PDFs; a submissão já está salva, então falhas aqui não a bloqueiam."""
+    try:
+        enqueue_submission(folder_name, file_paths)
+    except Exception:
+        pass  # 'python pdf_ingest.py backfill' recupera pastas não enfileiradas
+
+def persist_submission(final_data: Dict[str, Any]) -> bool:
+    """Enfileira a submissão e aguarda a confirmação do banco e do backup JSONL."""
+    try:
+        ticket = get_persistence_service().submit(final_data)
+    except queue.Full:
+        st.error("Servidor sobrecarregado. Tente enviar novamente em instantes.")
+        return False
+
+    for ack, label in ((ticket.database, "banco de dados"), (ticket.jsonl, "backup JSONL")):
+        try:
+            ack.result(timeout=STORE_ACK_TIMEOUT)
+        except FutureTimeoutError:
+            st.error(f"Tempo esgotado ao salvar no {label}. Tente novamente.")
+            return False
+        except Exception as e:
+            st.error(f"Erro ao salvar no {label}: {e}")
+            return False
+
+    # The workbook is rebuilt in the background (seconds later); never block the user on it
+    if ticket.excel.done() and ticket.excel.exception() is not None:
+        st.warning(f"Backup salvo, mas a planilha Excel não foi atualizada: {ticket.excel.exception()}")
+    else:
+        st.caption("A planilha de triagem será atualizada em segundo plano.")
+    return True
 
 def main() -> None:
     """Função Principal."""
-    load_css()
+    start_exporters()
+    start_ingest_worker()
     init_session_state()
-    render_header()
 
-    if st.session_state.step == 1:
-        process_step_1()
-    elif st.session_state.step == 2:
-        process_step_2()
+    stage = f"step_{st.session_state.step}_run"
+    with timed(stage), profiled(stage):
+        load_css()
+        render_header()
+
+        if st.session_state.step == 1:
+            process_step_1()
+        elif st.session_state.step == 2:
+            process_step_2()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
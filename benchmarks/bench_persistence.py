@@ -0,0 +1,348 @@
+"""
+BENCHMARK DE PERSISTÊNCIA b-Med
+-------------------------------
+Micro-benchmarks for the utils persistence functions (save_to_jsonl,
+save_uploaded_file) against synthetic submissions, the app's write path
+(PersistenceService.submit up to its database/JSONL acks, and the
+rebuild_workbook the background rebuilder runs), plus concurrent durable
+JSONL appends against a naive fsync per record.
+
+Runs offline. Examples:
+    python benchmarks/bench_persistence.py --out bench.json
+    python benchmarks/bench_persistence.py --quick --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settings import SD_INTENDED_USE_OPTIONS, SD_CRITICALITY_OPTIONS, SAMD_CLASS_OPTIONS  # noqa: E402
+from taxonomy import get_groups_definition  # noqa: E402
+from database import insert_submissions  # noqa: E402
+from excel_export import rebuild_workbook  # noqa: E402
+from persistence import PersistenceService  # noqa: E402
+from utils import append_to_jsonl, save_to_jsonl, save_uploaded_file  # noqa: E402
+
+DB_SIZES = [0, 1000, 10000, 50000]
+UPLOAD_SIZES = [100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2]
+QUICK_DB_SIZES = [0, 1000]
+QUICK_UPLOAD_SIZES = [100 * 1024, 1024 ** 2]
+
+# ==========================================
+# SYNTHETIC PAYLOADS
+# ==========================================
+
+def _specific_data(cluster: str, rng: random.Random) -> Dict[str, Any]:
+    """specific_data shaped like form_logic.render_cluster_questions output."""
+    if cluster == "Ferramentas de Gestão e Fluxo":
+        return {
+            "integration_type": rng.choice(["Não tem/CSV", "API Proprietária", "Padrão HL7 FHIR/v2"]),
+            "vocabularies": rng.choice(["Texto Livre", "TUSS/TISS/CID/SNOMED"]),
+            "click_count": rng.choice(["> 10 cliques", "6-9 cliques", "< 5 cliques"]),
+            "rto_rpo": rng.choice(["Backup Diário", "Tempo Real / Failover Automático"]),
+        }
+    if cluster == "Suporte à Diagnóstico e Conduta":
+        return {
+            "sd_intended_use": rng.choice(SD_INTENDED_USE_OPTIONS),
+            "sd_criticality": rng.choice(SD_CRITICALITY_OPTIONS),
+            "validation_type": rng.choice(["Nenhuma", "Validação Interna (Dados Retrospectivos)",
+                                           "Validação Prospectiva", "Validação Externa"]),
+            "samd_class": rng.choice(SAMD_CLASS_OPTIONS),
+        }
+    # Terapêuticas Digitais: optional branches change the column set
+    data: Dict[str, Any] = {
+        "clinical_evidence": rng.choice(["Ensaio Clínico Randomizado (ECR)", "Estudo Pré e Pós utilização",
+                                         "Estudo Piloto", "Não possuo evidência estruturada"]),
+        "engagement_process": "Gamificação e lembretes diários. " * rng.randint(1, 8),
+        "monetization_process": rng.choice(["B2B", "B2C assinatura", "B2B2C via operadoras"]),
+        "last_layout_update": date(2025, 1, 1) + timedelta(days=rng.randint(0, 600)),
+    }
+    if data["clinical_evidence"] != "Não possuo evidência estruturada":
+        data["study_doi"] = f"10.{rng.randint(1000, 9999)}/bmed.{rng.randint(1, 99999)}"
+        data["study_file_name"] = "estudo.pdf"
+    if rng.random() < 0.5:
+        data["prof_name"] = "Dra. Fulana"
+        data["prof_council_type"] = rng.choice(["CRM", "CRP", "CREFITO"])
+        data["prof_council_num"] = f"{rng.randint(1000, 99999)}/SP"
+    else:
+        data["prof_council"] = "Não aplicável"
+    return data
+
+def make_payload(rng: random.Random, index: int) -> Dict[str, Any]:
+    """One synthetic final_data payload, same shape as handle_final_submission builds."""
+    groups = get_groups_definition()
+    cluster = rng.choice(list(groups))
+    niche = rng.choice(groups[cluster])
+    name = f"Startup {index:06d}"
+    return {
+        "timestamp": (datetime(2026, 1, 1) + timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S"),
+        "startup_name": name,
+        "product_name": f"{name} App",
+        "niche": niche,
+        "cluster_macro": cluster,
+        "founder_ceo": "CEO Sintético",
+        "founder_cto": "CTO Sintético",
+        "email": f"contato{index}@example.com",
+        "phone": "+55 11 99999-0000",
+        "cnpj": f"{rng.randint(10**13, 10**14 - 1)}",
+        "website": "https://example.com",
+        "start_date": "2024-01-01",
+        "description": "Solução digital para saúde. " * rng.randint(1, 6),
+        "tech_anvisa_status": rng.choice(["Não se aplica", "Em processo", "Aprovado (Com Registro)", "Isento"]),
+        "tech_anvisa_num": "",
+        "tech_lgpd": rng.random() < 0.7,
+        "tech_cloud": rng.random() < 0.6,
+        "tech_iso": rng.random() < 0.2,
+        "folder_path": f"Submissoes/startup_{index:06d}",
+        "specific_data": _specific_data(cluster, rng),
+    }
+
+class FakeUpload:
+    """
+    Minimal stand-in for streamlit's UploadedFile (name + file API).
+
+    Serves a unique prefix followed by a shared payload without copying it,
+    so each call writes a distinct blob (no dedup hit) and the memory
+    measurement reflects the save path, not the test data.
+    """
+
+    def __init__(self, name: str, prefix: bytes, payload: bytes):
+        self.name = name
+        self._parts = (prefix, memoryview(payload))
+        self.size = len(prefix) + len(payload)
+        self._pos = 0
+
+    def seek(self, pos: int) -> None:
+        self._pos = pos
+
+    def read(self, size: int = -1) -> bytes:
+        prefix, payload = self._parts
+        if size < 0:
+            size = self.size - self._pos
+        out = b""
+        if self._pos < len(prefix):
+            out = prefix[self._pos:self._pos + size]
+        start = max(0, self._pos - len(prefix))
+        out += bytes(payload[start:start + size - len(out)])
+        self._pos += len(out)
+        return out
+
+    def getbuffer(self):
+        self.seek(0)
+        return self.read()
+
+# ==========================================
+# MEASUREMENT
+# ==========================================
+
+def _measure(fn: Callable[[], Any], calls: int) -> Dict[str, float]:
+    """Latency over 'calls' runs, then one extra run under tracemalloc for peak memory."""
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        "calls": calls,
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "max_ms": round(timings[-1], 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+def bench_database_sizes(workdir: str, db_sizes: List[int], calls: int, rng: random.Random) -> List[Dict[str, Any]]:
+    results = []
+    for size in db_sizes:
+        jsonl_path = os.path.join(workdir, f"db_{size}.jsonl")
+        prefill = [make_payload(rng, i) for i in range(size)]
+        append_to_jsonl(prefill, jsonl_path)
+        counter = iter(range(size, size + 10 * calls + 10))
+
+        function = "save_to_jsonl"
+        stats = _measure(lambda: save_to_jsonl(make_payload(rng, next(counter)), jsonl_path), calls)
+        results.append({"function": function, "db_rows": size, **stats})
+        print(f"  {function:<18} rows={size:<6} p50={stats['p50_ms']:>9.2f} ms  peak={stats['peak_kib']:>10.1f} KiB")
+    return results
+
+def bench_write_path(workdir: str, db_sizes: List[int], calls: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """What a submit costs the user (queue + database/JSONL acks) and what a background rebuild costs."""
+    results = []
+    for size in db_sizes:
+        base = os.path.join(workdir, f"app_{size}")
+        jsonl_path, excel_path, db_path = base + ".jsonl", base + ".xlsx", base + ".db"
+        prefill = [make_payload(rng, i) for i in range(size)]
+        append_to_jsonl(prefill, jsonl_path)
+        insert_submissions(prefill, db_path)
+        counter = iter(range(size, size + 10 * calls + 10))
+
+        service = PersistenceService(jsonl_path, excel_path, db_path, shard_dir="")
+
+        def submit():
+            ticket = service.submit(make_payload(rng, next(counter)))
+            ticket.database.result()
+            ticket.jsonl.result()
+
+        try:
+            cases = (
+                ("persistence_submit", submit, calls),
+                ("rebuild_workbook", lambda: rebuild_workbook(excel_path, jsonl_path), max(3, calls // 4)),
+            )
+            for function, run, runs in cases:
+                stats = _measure(run, runs)
+                results.append({"function": function, "db_rows": size, **stats})
+                print(f"  {function:<18} rows={size:<6} p50={stats['p50_ms']:>9.2f} ms  peak={stats['peak_kib']:>10.1f} KiB")
+        finally:
+            service.shutdown()
+    return results
+
+def bench_uploads(workdir: str, upload_sizes: List[int], calls: int) -> List[Dict[str, Any]]:
+    results = []
+    for size in upload_sizes:
+        payload = os.urandom(size)
+        counter = iter(range(10 * calls + 10))
+
+        def run():
+            index = next(counter)
+            upload = FakeUpload("deck.pdf", index.to_bytes(8, "little"), payload)
+            save_uploaded_file(upload, os.path.join(workdir, "Submissoes", f"s_{size}_{index}"))
+
+        stats = _measure(run, calls)
+        results.append({"function": "save_uploaded_file", "upload_bytes": size, **stats})
+        print(f"  save_uploaded_file bytes={size:<10} p50={stats['p50_ms']:>9.2f} ms  peak={stats['peak_kib']:>10.1f} KiB")
+    return results
+
+def bench_durable_jsonl(workdir: str, threads: int, calls: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Concurrent save_to_jsonl (group commit) against a naive write + fsync per record."""
+    payloads = [make_payload(rng, i) for i in range(threads * calls)]
+    naive_lock = threading.Lock()
+
+    def naive(data: Dict[str, Any], path: str) -> None:
+        with naive_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    results = []
+    for function, target in (("save_to_jsonl_durable", save_to_jsonl), ("fsync_per_record", naive)):
+        path = os.path.join(workdir, f"{function}.jsonl")
+        timings: List[float] = []
+
+        def worker(chunk: List[Dict[str, Any]]) -> None:
+            for data in chunk:
+                start = time.perf_counter()
+                target(data, path)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        workers = [threading.Thread(target=worker, args=(payloads[i::threads],)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        timings.sort()
+        stats = {
+            "calls": len(timings),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "p50_ms": round(timings[len(timings) // 2], 3),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            "max_ms": round(timings[-1], 3),
+            "peak_kib": 0.0,
+        }
+        results.append({"function": function, "threads": threads, **stats})
+        print(f"  {function:<22} threads={threads:<3} p50={stats['p50_ms']:>9.2f} ms  p95={stats['p95_ms']:>9.2f} ms")
+    return results
+
+def _key(result: Dict[str, Any]) -> str:
+    return f"{result['function']}|{result.get('db_rows', '')}|{result.get('upload_bytes', '')}|{result.get('threads', '')}"
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Returns one message per case whose p50 latency or peak memory grew beyond threshold."""
+    base = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = base.get(_key(result))
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "peak_kib"):
+            if previous[metric] > 0 and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append(
+                    f"{_key(result)} {metric}: {previous[metric]} -> {result[metric]} "
+                    f"(+{(result[metric] / previous[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench_persistence.json", help="Result JSON path.")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regression.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative growth (default 0.25).")
+    parser.add_argument("--calls", type=int, default=20, help="Calls per case.")
+    parser.add_argument("--db-sizes", type=int, nargs="+", help="Existing database sizes (rows).")
+    parser.add_argument("--upload-sizes", type=int, nargs="+", help="Upload sizes (bytes).")
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent writers for the durability case.")
+    parser.add_argument("--quick", action="store_true", help="Small sizes for a fast smoke run.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    db_sizes = args.db_sizes or (QUICK_DB_SIZES if args.quick else DB_SIZES)
+    upload_sizes = args.upload_sizes or (QUICK_UPLOAD_SIZES if args.quick else UPLOAD_SIZES)
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="bmed_bench_") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # blob store paths are relative to the working directory
+        try:
+            print("Banco de dados:")
+            results = bench_database_sizes(workdir, db_sizes, args.calls, rng)
+            print("Caminho de escrita do app:")
+            results += bench_write_path(workdir, db_sizes, args.calls, rng)
+            print("Uploads:")
+            results += bench_uploads(workdir, upload_sizes, max(3, args.calls // 4))
+            print("Durabilidade JSONL (concorrente):")
+            results += bench_durable_jsonl(workdir, args.threads, args.calls, rng)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "calls": args.calls,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados salvos em {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for message in regressions:
+            print(f"REGRESSÃO: {message}")
+        if regressions:
+            return 1
+        print("Nenhuma regressão acima do limite.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+CARGA CONCORRENTE b-Med
+-----------------------
+Headless end-to-end load harness for Plataforma_startups.py.
+
+Each simulated session drives the real form through Streamlit's AppTest:
+process_step_1 -> validate_step_1 -> process_step_2 -> handle_final_submission,
+with random niches/clusters, cluster answers and PDF attachments. AppTest
+keeps process-global runtime state, so each worker process runs its
+sessions one after another and concurrency comes from the number of
+processes. The harness reports throughput, submit latency percentiles and
+checks that SQLite, JSONL and Excel agree afterwards.
+
+By default each process writes to its own data directory (one server per
+volume). --shared-dir points every process at the same files, which is
+the multi-replica scenario.
+
+Examples:
+    python benchmarks/load_harness.py --processes 4 --sessions 25
+    python benchmarks/load_harness.py --processes 4 --sessions 25 --shared-dir
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "Plataforma_startups.py")
+sys.path.insert(0, ROOT)
+
+DOC_LABELS = ["Pitch Deck", "Manual do Usuário", "Comprovante ANVISA", "Evidência Científica", "PDF do Estudo",
+              "Projeto Submetido"]
+
+def _fake_pdf(rng: random.Random, max_kib: int) -> bytes:
+    body = rng.randbytes(rng.randint(1, max_kib) * 1024)
+    return b"%PDF-1.4\n" + body + b"\n%%EOF\n"
+
+def _button(at, text: str):
+    return next(b for b in at.button if text in str(b.label))
+
+def run_session(session_id: str, seed: int, attach_prob: float, max_kib: int, timeout: float) -> Dict[str, Any]:
+    """Drives one founder through the whole form. Returns timings and outcome."""
+    from streamlit.testing.v1 import AppTest
+    from taxonomy import get_taxonomy
+
+    rng = random.Random(seed)
+    result: Dict[str, Any] = {"session": session_id, "ok": False}
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        at.run()
+
+        # Step 1: general data. Widgets in a form are committed by the submit click.
+        startup_name = f"Carga {session_id}"
+        at.text_input(key="startup_name").input(startup_name)
+        at.text_input(key="product_name").input(f"Produto {session_id}")
+        at.text_input(key="email").input(f"{session_id.replace('-', '.')}@carga.example.com")
+        at.text_input(key="cnpj").input(str(rng.randint(10**13, 10**14 - 1)))
+        at.text_area(key="description").input("Submissão sintética de carga.")
+        taxonomy = get_taxonomy()
+        niche = rng.choice(taxonomy.all_niches)
+        at.selectbox(key="niche").select(niche)
+        if niche == taxonomy.unlisted_niche:
+            at.selectbox(key="manual_cluster").select(rng.choice(taxonomy.clusters))
+        _button(at, "Avançar").click()
+        start = time.perf_counter()
+        at.run()
+        result["step1_s"] = time.perf_counter() - start
+        if at.session_state.step != 2:
+            result["error"] = f"Etapa 1 não avançou: {[e.value for e in at.error]}"
+            return result
+
+        # Step 2: random cluster answers (may reveal the study uploader), then attachments
+        for radio in at.radio:
+            radio.set_value(rng.choice(radio.options))
+        for checkbox in at.checkbox:
+            checkbox.set_value(rng.random() < 0.5)
+        at.run()
+        for uploader in at.file_uploader:
+            if rng.random() < attach_prob:
+                uploader.set_value((f"{session_id}_{uploader.label[:12].strip()}.pdf",
+                                    _fake_pdf(rng, max_kib), "application/pdf"))
+
+        _button(at, "Enviar").click()
+        start = time.perf_counter()
+        at.run()
+        result["submit_s"] = time.perf_counter() - start
+
+        if at.exception:
+            result["error"] = at.exception[0].message
+        elif not at.success:
+            result["error"] = f"Sem confirmação: {[e.value for e in at.error]}"
+        else:
+            result["ok"] = True
+            result["startup_name"] = startup_name
+    except Exception:
+        result["error"] = traceback.format_exc(limit=3)
+    return result
+
+def worker(args: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One process = one simulated server, running its sessions back to back."""
+    os.chdir(args["data_dir"])
+    from persistence import get_persistence_service
+
+    seeds = random.Random(args["seed"])
+    results = [
+        run_session(f"p{args['worker']}-s{i}", seeds.randrange(2**32),
+                    args["attach_prob"], args["max_kib"], args["timeout"])
+        for i in range(args["sessions"])
+    ]
+    get_persistence_service().flush()
+    for r in results:
+        r["data_dir"] = args["data_dir"]
+    return results
+
+# ==========================================
+# INTEGRITY CHECKS
+# ==========================================
+
+def check_integrity(data_dir: str, expected_names: List[str]) -> Dict[str, Any]:
+    """Compares the three stores against the sessions that got a success message."""
+    from openpyxl import load_workbook
+
+    report: Dict[str, Any] = {"data_dir": data_dir, "expected": len(expected_names), "problems": []}
+
+    jsonl_path = os.path.join(data_dir, "bmed_submissions.jsonl")
+    jsonl_names, bad_lines = [], 0
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    jsonl_names.append(json.loads(line)["startup_name"])
+                except (ValueError, KeyError):
+                    bad_lines += 1
+    report["jsonl_rows"] = len(jsonl_names)
+    if bad_lines:
+        report["problems"].append(f"{bad_lines} linhas JSONL corrompidas/intercaladas")
+
+    excel_path = os.path.join(data_dir, "bmed_startups_database.xlsx")
+    excel_rows = 0
+    if os.path.exists(excel_path):
+        try:
+            wb = load_workbook(excel_path, read_only=True)
+            # Streamed workbooks carry no dimension record, so max_row is unknown: count the rows
+            excel_rows = sum(max(sum(1 for _ in ws.iter_rows(values_only=True)) - 1, 0) for ws in wb.worksheets)
+            wb.close()
+        except Exception as e:
+            report["problems"].append(f"Planilha Excel ilegível: {e}")
+    report["excel_rows"] = excel_rows
+
+    db_path = os.path.join(data_dir, "bmed_submissions.db")
+    db_rows = 0
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        db_rows = conn.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+        conn.close()
+    report["db_rows"] = db_rows
+
+    for store, count in (("JSONL", len(jsonl_names)), ("Excel", excel_rows), ("SQLite", db_rows)):
+        if count != len(expected_names):
+            report["problems"].append(f"{store}: {count} linhas, esperado {len(expected_names)}")
+    missing = set(expected_names) - set(jsonl_names)
+    duplicated = len(jsonl_names) - len(set(jsonl_names))
+    if missing:
+        report["problems"].append(f"{len(missing)} submissões confirmadas ausentes do JSONL")
+    if duplicated:
+        report["problems"].append(f"{duplicated} linhas JSONL duplicadas")
+    return report
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4, help="Concurrent worker processes.")
+    parser.add_argument("--sessions", type=int, default=10, help="Sessions per process.")
+    parser.add_argument("--attach-prob", type=float, default=0.6, help="Chance of filling each uploader.")
+    parser.add_argument("--max-kib", type=int, default=512, help="Max attachment size (KiB).")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per script-run timeout (s).")
+    parser.add_argument("--shared-dir", action="store_true",
+                        help="All processes share one data directory (cross-process contention).")
+    parser.add_argument("--workdir", help="Data directory root (default: temp dir, kept).")
+    parser.add_argument("--out", default="load_harness.json", help="Report JSON path.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bmed_load_")
+    jobs = []
+    for w in range(args.processes):
+        data_dir = workdir if args.shared_dir else os.path.join(workdir, f"server_{w}")
+        os.makedirs(data_dir, exist_ok=True)
+        jobs.append({
+            "worker": w, "data_dir": data_dir, "sessions": args.sessions,
+            "attach_prob": args.attach_prob, "max_kib": args.max_kib, "timeout": args.timeout,
+            "seed": args.seed + w,
+        })
+
+    print(f"{args.processes} processos x {args.sessions} sessões em {workdir}")
+    start = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        results = [r for batch in pool.map(worker, jobs) for r in batch]
+    wall = time.perf_counter() - start
+
+    ok = [r for r in results if r["ok"]]
+    submit = [r["submit_s"] for r in ok]
+    integrity = []
+    for data_dir in sorted({job["data_dir"] for job in jobs}):
+        names = [r["startup_name"] for r in ok if r["data_dir"] == data_dir]
+        integrity.append(check_integrity(data_dir, names))
+
+    summary = {
+        "sessions": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "wall_s": round(wall, 2),
+        "throughput_per_s": round(len(ok) / wall, 3) if wall else 0.0,
+        "submit_p50_ms": round(percentile(submit, 50) * 1000, 1),
+        "submit_p95_ms": round(percentile(submit, 95) * 1000, 1),
+        "submit_p99_ms": round(percentile(submit, 99) * 1000, 1),
+        "integrity_ok": all(not r["problems"] for r in integrity),
+    }
+    report = {
+        "meta": {"created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **vars(args), "workdir": workdir},
+        "summary": summary,
+        "integrity": integrity,
+        "errors": [{"session": r["session"], "error": r["error"]} for r in results if not r["ok"]],
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    for key, value in summary.items():
+        print(f"  {key:<18} {value}")
+    for r in integrity:
+        for problem in r["problems"]:
+            print(f"  INTEGRIDADE [{r['data_dir']}]: {problem}")
+    for error in report["errors"][:5]:
+        print(f"  ERRO {error['session']}: {error['error'].splitlines()[-1] if error['error'] else ''}")
+    print(f"Relatório salvo em {args.out}")
+    return 0 if summary["integrity_ok"] and not report["errors"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Tuple
+
+# ==========================================
+# CONTENT-ADDRESSED UPLOAD STORAGE
+# ==========================================
+
+BLOB_ROOT = os.path.join("Submissoes", "_blobs")
+CHUNK_SIZE = 1024 * 1024  # 1 MiB per read keeps peak memory flat per upload
+MANIFEST_NAME = "manifest.json"
+
+# mkstemp() creates 0600 files; blobs are immutable once stored, so they are
+# published read-only for everyone (a fixed mode: probing the umask would
+# briefly change it for every thread of the process)
+BLOB_MODE = 0o444
+
+_manifest_lock = threading.Lock()
+
+def blob_path(digest: str, blob_root: str = BLOB_ROOT) -> str:
+    """Returns the sharded location of a blob: <root>/ab/cd/<sha256>."""
+    return os.path.join(blob_root, digest[:2], digest[2:4], digest)
+
+def store_blob(fileobj: BinaryIO, blob_root: str = BLOB_ROOT, chunk_size: int = CHUNK_SIZE) -> Tuple[str, int, str]:
+    """
+    Streams a file object into the blob store, hashing while it copies.
+
+    The data is spooled to a temp file inside the blob root and renamed into
+    place only if no blob with the same SHA-256 exists yet, so identical
+    resubmissions are stored once.
+
+    Args:
+        fileobj: Readable binary file object (e.g. Streamlit UploadedFile).
+        blob_root (str): Root directory of the blob store.
+        chunk_size (int): Bytes read per iteration.
+
+    Returns:
+        Tuple[str, int, str]: (sha256 hex digest, size in bytes, blob path).
+    """
+    tmp_dir = os.path.join(blob_root, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+
+    hasher = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        digest = hasher.hexdigest()
+        target = blob_path(digest, blob_root)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.chmod(tmp_path, BLOB_MODE)
+            os.replace(tmp_path, target)
+        return digest, size, target
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def adopt_file(path: str, blob_root: str = BLOB_ROOT, chunk_size: int = CHUNK_SIZE) -> Tuple[str, int, str]:
+    """
+    Adds a file already on disk (e.g. a spooled upload) to the blob store.
+
+    The file is hashed in chunks and hard-linked into place instead of
+    copied; the source content is left untouched so a failed submission
+    can retry (a linked blob shares its inode, so it becomes read-only too).
+
+    Returns:
+        Tuple[str, int, str]: (sha256 hex digest, size in bytes, blob path).
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+
+    digest = hasher.hexdigest()
+    target = blob_path(digest, blob_root)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(path, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            tmp_dir = os.path.join(blob_root, "tmp")
+            os.makedirs(tmp_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+            os.close(fd)
+            shutil.copyfile(path, tmp_path)
+            os.chmod(tmp_path, BLOB_MODE)
+            os.replace(tmp_path, target)
+        else:
+            os.chmod(target, BLOB_MODE)
+    return digest, size, target
+
+def link_blob(source: str, dest: str) -> None:
+    """
+    Exposes a blob under its original name in a submission folder.
+
+    Hard links keep a single copy on disk; filesystems without hard link
+    support fall back to a plain copy.
+    """
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+def load_manifest(folder_path: str) -> Dict[str, Any]:
+    """Reads the manifest of a submission folder ({} if there is none)."""
+    manifest_path = os.path.join(folder_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+def record_in_manifest(folder_path: str, filename: str, digest: str, size: int) -> None:
+    """Maps an original filename to its blob in the folder's manifest.json."""
+    with _manifest_lock:
+        manifest = load_manifest(folder_path)
+        manifest[filename] = {
+            "sha256": digest,
+            "size": size,
+            "blob": blob_path(digest),
+            "stored_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        manifest_path = os.path.join(folder_path, MANIFEST_NAME)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
@@ -0,0 +1,514 @@
+"""
+BULK IMPORT & REPLAY b-Med
+--------------------------
+Loads historical submissions (old spreadsheets, earlier JSONL backups) and
+replays bmed_submissions.jsonl into the stores, in large batches.
+
+'import' validates every record with the Step 1 rules
+(utils.validate_general_data) and resolves its cluster from the niche.
+Each batch is written with one SQLite transaction, one JSONL group commit
+and one search-index transaction. Invalid records go to an error report
+instead of stopping the run.
+
+'replay' re-reads the JSONL history (already validated at submission time)
+into SQLite and the search index. Use it to rebuild a lost or new database.
+
+Both commands rebuild the Excel workbook from scratch at the end with the
+streaming exporter, under the same lock and temp-file swap the app uses.
+Appending batch by batch would re-read the sheets on every batch. Progress
+is checkpointed after every batch. Records without a submission_id get one
+derived from their content, so an interrupted or repeated run never stores
+a record twice. The checkpoint also records how far the database and the
+JSONL had got, so a batch that reached SQLite but not the JSONL before a
+crash is still written to the JSONL on resume.
+
+Usage:
+    python bulk_import.py import planilha_2022.xlsx backup_2023.jsonl cadastro.csv
+    python bulk_import.py replay --db novo.db
+    python bulk_import.py import backup.jsonl --restart --errors erros.jsonl
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from openpyxl import load_workbook
+
+from database import BOOLEAN_COLUMNS, DEFAULT_DB, SUBMISSION_COLUMNS, get_connection, insert_submissions
+from excel_export import rebuild_workbook
+from metrics import timed
+from submission_log import canonical_path, ids_appended_since
+from utils import append_to_jsonl, validate_general_data
+
+BATCH_SIZE = 5000
+CHECKPOINT_FILE = "bmed_import_checkpoint.json"
+ERRORS_FILE = "bmed_import_errors.jsonl"
+# Content-derived submission_ids for records that predate them (same shape as uuid4().hex)
+_LEGACY_NAMESPACE = uuid.UUID("5f0c6b2e-8d3a-4c1e-9b7a-2e6d1f4a8c90")
+_TRUE_STRINGS = frozenset({"true", "1", "sim", "yes", "verdadeiro", "x"})
+
+# Each reader yields (location, record or None, parse error or None) from a 0-based ordinal on
+SourceItem = Tuple[str, Optional[Dict[str, Any]], Optional[str]]
+
+@dataclass
+class ImportStats:
+    """Counters for one source (or a whole run)."""
+    read: int = 0
+    stored: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+
+    def add(self, other: "ImportStats") -> None:
+        self.read += other.read
+        self.stored += other.stored
+        self.duplicates += other.duplicates
+        self.invalid += other.invalid
+
+# ==========================================
+# SOURCE READERS
+# ==========================================
+
+def _read_jsonl(path: str, start: int = 0) -> Iterator[SourceItem]:
+    """JSONL lines; skipped lines are not decoded, and a trailing line without newline is left alone."""
+    with open(path, "rb") as f:
+        for ordinal, line in enumerate(f):
+            if not line.endswith(b"\n"):
+                break
+            if ordinal < start:
+                continue
+            location = f"linha {ordinal + 1}"
+            if not line.strip():
+                yield location, None, "linha vazia"
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield location, None, f"JSON inválido: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield location, None, "a linha não é um objeto JSON"
+                continue
+            yield location, record, None
+
+def _cell_value(column: str, value: Any) -> Any:
+    """Maps a spreadsheet cell back to the value the form would have produced."""
+    if isinstance(value, str):
+        if column in BOOLEAN_COLUMNS:
+            return value.strip().lower() in _TRUE_STRINGS
+        return value
+    if isinstance(value, datetime):
+        if column == "timestamp" or value.time() != datetime.min.time():
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if column in BOOLEAN_COLUMNS:
+        return bool(value)
+    return value
+
+def _unflatten(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuilds the final_data shape from a flat spreadsheet row.
+
+    Known top-level fields stay on top and every other column goes to
+    specific_data. Empty cells are dropped, since a cluster sheet holds
+    the union of its rows' columns.
+    """
+    record: Dict[str, Any] = {}
+    specific: Dict[str, Any] = {}
+    for column, value in row.items():
+        if column is None or column in ("id", "_id"):
+            continue
+        column = str(column).strip()
+        value = _cell_value(column, value)
+        if value is None or value == "":
+            continue
+        (record if column in SUBMISSION_COLUMNS else specific)[column] = value
+    record["specific_data"] = specific
+    return record
+
+def _read_excel(path: str, start: int = 0) -> Iterator[SourceItem]:
+    """Every sheet of a workbook, header in the first row (the layout the app exports)."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ordinal = 0
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            for row_number, values in enumerate(rows, start=2):
+                if not any(v not in (None, "") for v in values):
+                    continue
+                if ordinal >= start:
+                    yield f"{ws.title}!{row_number}", _unflatten(dict(zip(header, values))), None
+                ordinal += 1
+    finally:
+        wb.close()
+
+def _read_csv(path: str, start: int = 0) -> Iterator[SourceItem]:
+    """A flat CSV export with a header row (';' or ',' separated)."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;")
+        except csv.Error:
+            dialect = csv.excel
+        for ordinal, row in enumerate(csv.DictReader(f, dialect=dialect)):
+            if ordinal >= start:
+                yield f"linha {ordinal + 2}", _unflatten(row), None
+
+_READERS = {".jsonl": _read_jsonl, ".json": _read_jsonl, ".xlsx": _read_excel, ".xlsm": _read_excel, ".csv": _read_csv}
+
+def read_source(path: str, start: int = 0) -> Iterator[SourceItem]:
+    """
+    Reads one import source, picked by extension.
+
+    Raises:
+        ValueError: Unsupported file type.
+    """
+    reader = _READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError(f"Formato não suportado: {path} (use .jsonl, .xlsx ou .csv)")
+    return reader(path, start)
+
+# ==========================================
+# RECORD PREPARATION
+# ==========================================
+
+def legacy_submission_id(record: Dict[str, Any]) -> str:
+    """
+    Deterministic submission_id for a record that has none.
+
+    Built from normalized stable fields (timestamp, startup name, e-mail),
+    not from the record's shape: the same submission read from an old
+    spreadsheet (flattened) and from an old JSONL (nested specific_data)
+    gets the same id. Records missing all three fall back to their content.
+    """
+    key = (
+        str(record.get("timestamp") or "").strip(),
+        " ".join(str(record.get("startup_name") or "").split()),
+        str(record.get("email") or "").strip().lower(),
+    )
+    if not any(key):
+        key = (json.dumps(record, sort_keys=True, ensure_ascii=False, default=str),)
+    return uuid.uuid5(_LEGACY_NAMESPACE, "\x1f".join(key)).hex
+
+def prepare_record(record: Dict[str, Any], validate: bool = True) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Validates a record and normalizes it into a final_data payload.
+
+    Args:
+        record (Dict): Raw record from a source.
+        validate (bool): Apply the Step 1 rules and re-resolve the cluster
+            (off for replays, whose records passed them when submitted).
+
+    Returns:
+        Tuple[Optional[Dict], List[str]]: (payload, []) or (None, error messages).
+    """
+    data = dict(record)
+    data.pop("_id", None)
+    data.pop("id", None)
+    if not isinstance(data.get("specific_data"), dict):
+        data["specific_data"] = {}
+    if validate:
+        errors, cluster = validate_general_data(data)
+        if errors:
+            return None, errors
+        data["cluster_macro"] = cluster
+    if not data.get("submission_id"):
+        data["submission_id"] = legacy_submission_id(record)
+        data["_legacy"] = True
+    return data, []
+
+def _adopt_legacy_rows(records: List[Dict[str, Any]], db_path: str) -> None:
+    """
+    Stamps content-derived ids on matching stored rows that have none.
+
+    Rows saved before submission_id existed would otherwise be inserted a
+    second time by a replay; matching on timestamp, name and e-mail lets
+    INSERT OR IGNORE recognize them.
+    """
+    legacy = [data for data in records if data.pop("_legacy", False) and data.get("timestamp")]
+    if not legacy:
+        return
+    conn = get_connection(db_path)
+    with conn:
+        conn.executemany(
+            "UPDATE submissions SET submission_id = ? WHERE id = ("
+            "SELECT id FROM submissions WHERE submission_id IS NULL "
+            "AND timestamp = ? AND startup_name IS ? AND email IS ? LIMIT 1)",
+            [
+                (data["submission_id"], str(data["timestamp"]), data.get("startup_name"), data.get("email"))
+                for data in legacy
+            ],
+        )
+
+# ==========================================
+# BATCHED WRITES, CHECKPOINTS AND ERROR REPORT
+# ==========================================
+
+def _signature(path: str) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _load_checkpoint(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+def _resume_entry(entry: Optional[Dict[str, Any]], source: str) -> Optional[Dict[str, Any]]:
+    """The checkpoint entry of a previous run, if the source is still the file it read."""
+    if not entry:
+        return None
+    signature = _signature(source)
+    if source.endswith(".jsonl"):
+        # Append-only: positions stay valid while the file only grows
+        valid = signature[1] >= entry["signature"][1]
+    else:
+        valid = signature == entry["signature"]
+    return entry if valid else None
+
+def _store_marks(db_path: str, jsonl_filename: Optional[str]) -> Dict[str, int]:
+    """Highest row id and JSONL size right now: what a checkpoint has already accounted for."""
+    max_id = get_connection(db_path).execute("SELECT COALESCE(MAX(id), 0) FROM submissions").fetchone()[0]
+    jsonl_size = os.path.getsize(jsonl_filename) if jsonl_filename and os.path.exists(jsonl_filename) else 0
+    return {"max_id": max_id, "jsonl_size": jsonl_size}
+
+def _store_batch(
+    batch: List[Dict[str, Any]],
+    db_path: str,
+    jsonl_filename: Optional[str],
+    marks: Dict[str, int],
+) -> Tuple[int, int]:
+    """
+    Writes one batch to SQLite, the JSONL backup and the search index.
+
+    A record counts as stored by this run if its row is newer than the
+    last checkpoint's 'max_id', whether this call inserted it or an
+    attempt that crashed before the checkpoint did. Those records go to
+    the JSONL unless they are already past the checkpoint's 'jsonl_size',
+    so a retried batch is neither lost from the backup nor written twice.
+    """
+    from search_index import index_submissions
+
+    with timed("bulk_import_batch"):
+        _adopt_legacy_rows(batch, db_path)
+        ids = insert_submissions(batch, db_path)
+        stored = {
+            row[0] for row in get_connection(db_path).execute(
+                "SELECT submission_id FROM submissions WHERE id > ?", (marks["max_id"],)
+            )
+        }
+        new = {data["submission_id"]: data for data in batch if data["submission_id"] in stored}
+        if jsonl_filename:
+            logged = ids_appended_since(jsonl_filename, marks["jsonl_size"])
+            append_to_jsonl([data for sid, data in new.items() if sid not in logged], jsonl_filename)
+        index_submissions(ids, batch, db_path)
+    return len(new), len(batch) - len(new)
+
+def _process_source(
+    source: str,
+    key: str,
+    state: Dict[str, Any],
+    checkpoint_path: str,
+    errors_out,
+    db_path: str,
+    jsonl_filename: Optional[str],
+    batch_size: int,
+    validate: bool,
+) -> ImportStats:
+    entry = _resume_entry(state.get(key), source)
+    start = entry["position"] if entry else 0
+    stats = ImportStats(**entry["stats"]) if entry else ImportStats()
+    if start:
+        print(f"[{os.path.basename(source)}] retomando a partir do registro {start}", flush=True)
+
+    signature = _signature(source)
+    position = checkpointed = start
+    batch: List[Dict[str, Any]] = []
+    batch_number = 0
+    started = time.perf_counter()
+    if entry and "max_id" in entry:
+        marks = {"max_id": entry["max_id"], "jsonl_size": entry["jsonl_size"]}
+    else:
+        marks = _store_marks(db_path, jsonl_filename)
+
+    def save_checkpoint() -> None:
+        state[key] = {"signature": signature, "position": position, "stats": asdict(stats), **marks}
+        _save_checkpoint(checkpoint_path, state)
+
+    if not entry:
+        save_checkpoint()  # the marks must be on disk before the first batch can be interrupted
+
+    def flush() -> None:
+        nonlocal batch, batch_number, checkpointed, marks
+        stored, duplicates = _store_batch(batch, db_path, jsonl_filename, marks)
+        stats.stored += stored
+        stats.duplicates += duplicates
+        batch = []
+        batch_number += 1
+        checkpointed = position
+        marks = _store_marks(db_path, jsonl_filename)
+        save_checkpoint()
+        rate = (position - start) / max(time.perf_counter() - started, 1e-9)
+        print(
+            f"[{os.path.basename(source)}] lote {batch_number}: {stats.read} lidos · {stats.stored} novos · "
+            f"{stats.duplicates} já existentes · {stats.invalid} inválidos · {rate:.0f} reg/s",
+            flush=True,
+        )
+
+    for location, record, parse_error in read_source(source, start):
+        position += 1
+        stats.read += 1
+        errors = [parse_error] if parse_error else []
+        data = None
+        if record is not None:
+            data, errors = prepare_record(record, validate)
+        if data is None:
+            stats.invalid += 1
+            errors_out.write(json.dumps(
+                {"source": source, "location": location, "errors": errors, "record": record},
+                ensure_ascii=False, default=str,
+            ) + "\n")
+            continue
+        batch.append(data)
+        if len(batch) >= batch_size:
+            flush()
+    if position != checkpointed:
+        flush()
+    errors_out.flush()
+    return stats
+
+def _run(
+    mode: str,
+    sources: Sequence[str],
+    db_path: str,
+    jsonl_filename: str,
+    excel_filename: Optional[str],
+    batch_size: int,
+    checkpoint_path: str,
+    errors_path: str,
+    restart: bool,
+) -> ImportStats:
+    state = {} if restart else _load_checkpoint(checkpoint_path)
+    total = ImportStats()
+    with open(errors_path, "a" if state else "w", encoding="utf-8") as errors_out:
+        for source in sources:
+            stats = _process_source(
+                source, f"{mode}:{os.path.abspath(source)}", state, checkpoint_path, errors_out,
+                db_path, jsonl_filename if mode == "import" else None, batch_size,
+                validate=(mode == "import"),
+            )
+            total.add(stats)
+
+    from risk import score_store
+    score_store(db_path)
+    if excel_filename:
+        start = time.perf_counter()
+        exported = rebuild_workbook(excel_filename, jsonl_filename)
+        print(f"Planilha {excel_filename} reconstruída: {exported} submissões em {time.perf_counter() - start:.1f}s", flush=True)
+    return total
+
+def import_sources(
+    sources: Sequence[str],
+    db_path: str = DEFAULT_DB,
+    jsonl_filename: str = "bmed_submissions.jsonl",
+    excel_filename: Optional[str] = "bmed_startups_database.xlsx",
+    batch_size: int = BATCH_SIZE,
+    checkpoint_path: str = CHECKPOINT_FILE,
+    errors_path: str = ERRORS_FILE,
+    restart: bool = False,
+) -> ImportStats:
+    """
+    Validates and loads historical submissions into every store.
+
+    Args:
+        sources (Sequence[str]): .jsonl, .xlsx or .csv files, processed in order.
+        db_path (str): SQLite database path.
+        jsonl_filename (str): JSONL backup that receives the new records.
+        excel_filename (Optional[str]): Workbook rebuilt at the end (None skips it).
+        batch_size (int): Records per write batch (and per checkpoint).
+        checkpoint_path (str): Progress file; a rerun resumes where it stopped.
+        errors_path (str): JSONL report of rejected records.
+        restart (bool): Ignore the checkpoint and read every source again.
+
+    Returns:
+        ImportStats: Totals over all sources.
+    """
+    return _run("import", sources, db_path, jsonl_filename, excel_filename,
+                batch_size, checkpoint_path, errors_path, restart)
+
+def replay_jsonl(
+    jsonl_filename: str = "bmed_submissions.jsonl",
+    db_path: str = DEFAULT_DB,
+    excel_filename: Optional[str] = "bmed_startups_database.xlsx",
+    batch_size: int = BATCH_SIZE,
+    checkpoint_path: str = CHECKPOINT_FILE,
+    errors_path: str = ERRORS_FILE,
+    restart: bool = False,
+) -> ImportStats:
+    """
+    Rebuilds SQLite, the search index and the Excel workbook from the JSONL history.
+
+    Records already stored are skipped, so replaying into the live
+    database only fills in what is missing.
+
+    Returns:
+        ImportStats: Totals for the replayed file.
+    """
+    return _run("replay", [jsonl_filename], db_path, jsonl_filename, excel_filename,
+                batch_size, checkpoint_path, errors_path, restart)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["import", "replay"])
+    parser.add_argument("sources", nargs="*", help="Files to import (.jsonl, .xlsx, .csv).")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database.")
+    parser.add_argument("--jsonl", default=canonical_path("bmed_submissions.jsonl"), help="Submission history (JSONL).")
+    parser.add_argument("--excel", default=canonical_path("bmed_startups_database.xlsx"), help="Workbook rebuilt at the end.")
+    parser.add_argument("--skip-excel", action="store_true", help="Do not rebuild the workbook.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--errors", default=ERRORS_FILE, help="Report of rejected records (JSONL).")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint.")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        if not args.sources:
+            parser.error("informe ao menos um arquivo para importar")
+        for source in args.sources:
+            if os.path.splitext(source)[1].lower() not in _READERS:
+                parser.error(f"formato não suportado: {source} (use .jsonl, .xlsx ou .csv)")
+            if os.path.abspath(source) == os.path.abspath(args.jsonl):
+                parser.error(f"{source} é o próprio histórico; use o comando 'replay'")
+    options = dict(
+        db_path=args.db, excel_filename=None if args.skip_excel else args.excel, batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint, errors_path=args.errors, restart=args.restart,
+    )
+    start = time.perf_counter()
+    if args.command == "import":
+        stats = import_sources(args.sources, jsonl_filename=args.jsonl, **options)
+    else:
+        stats = replay_jsonl(args.jsonl, **options)
+    print(
+        f"{stats.read} lidos · {stats.stored} novos · {stats.duplicates} já existentes · "
+        f"{stats.invalid} inválidos em {time.perf_counter() - start:.1f}s"
+        + (f" (erros em {args.errors})" if stats.invalid else "")
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import pandas as pd
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from metrics import timed
+from submission_log import canonical_path
+
+# ==========================================
+# SQLITE SUBMISSION STORE (SYSTEM OF RECORD)
+# ==========================================
+
+# With sharded replicas (BMED_SHARD_DIR) this is the one store they all compact into and read
+DEFAULT_DB = canonical_path("bmed_submissions.db")
+
+# Top-level final_data fields stored as real columns
+SUBMISSION_COLUMNS = (
+    "timestamp", "startup_name", "product_name", "niche", "cluster_macro",
+    "founder_ceo", "founder_cto", "email", "phone", "cnpj", "website",
+    "start_date", "description", "tech_anvisa_status", "tech_anvisa_num",
+    "tech_lgpd", "tech_cloud", "tech_iso", "folder_path", "submission_id",
+)
+BOOLEAN_COLUMNS = ("tech_lgpd", "tech_cloud", "tech_iso")
+INDEXED_COLUMNS = ("cluster_macro", "niche", "cnpj", "email", "timestamp")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {columns},
+    specific_data TEXT NOT NULL DEFAULT '{{}}',
+    extra_data TEXT NOT NULL DEFAULT '{{}}'
+);
+{indexes}
+""".format(
+    columns=",\n    ".join(
+        f"{c} INTEGER" if c in BOOLEAN_COLUMNS else f"{c} TEXT" for c in SUBMISSION_COLUMNS
+    ),
+    indexes="\n".join(
+        f"CREATE INDEX IF NOT EXISTS idx_submissions_{c} ON submissions ({c});" for c in INDEXED_COLUMNS
+    ),
+)
+
+_local = threading.local()
+
+def get_connection(db_path: str = DEFAULT_DB) -> sqlite3.Connection:
+    """
+    Returns a per-thread connection in WAL mode, creating the schema once.
+
+    sqlite3 connections cannot be shared across threads, so each Streamlit
+    script thread and the persistence writer keep their own.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = os.path.abspath(db_path)
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        connections[key] = conn
+    return conn
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Adds columns introduced after a database was created."""
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(submissions)")}
+    with conn:
+        for column in SUBMISSION_COLUMNS:
+            if column not in existing:
+                kind = "INTEGER" if column in BOOLEAN_COLUMNS else "TEXT"
+                conn.execute(f"ALTER TABLE submissions ADD COLUMN {column} {kind}")
+        # Lets replays (shard compaction, imports) skip submissions already stored
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_submissions_submission_id ON submissions (submission_id)"
+        )
+
+def _to_row(data: Dict[str, Any]) -> tuple:
+    """Splits a final_data payload into column values plus JSON blobs."""
+    specific = data.get("specific_data") or {}
+    extra = {k: v for k, v in data.items() if k not in SUBMISSION_COLUMNS and k != "specific_data"}
+    values = []
+    for column in SUBMISSION_COLUMNS:
+        value = data.get(column)
+        if column in BOOLEAN_COLUMNS and value is not None:
+            value = int(bool(value))
+        elif value is not None and not isinstance(value, str):
+            value = str(value)
+        values.append(value)
+    values.append(json.dumps(specific, ensure_ascii=False, default=str))
+    values.append(json.dumps(extra, ensure_ascii=False, default=str))
+    return tuple(values)
+
+def _to_record(row: sqlite3.Row) -> Dict[str, Any]:
+    """Rebuilds the original final_data shape from a stored row."""
+    record = {"id": row["id"]}
+    for column in SUBMISSION_COLUMNS:
+        value = row[column]
+        if column in BOOLEAN_COLUMNS and value is not None:
+            value = bool(value)
+        record[column] = value
+    record.update(json.loads(row["extra_data"]))
+    record["specific_data"] = json.loads(row["specific_data"])
+    return record
+
+def insert_submissions(records: List[Dict[str, Any]], db_path: str = DEFAULT_DB) -> List[Optional[int]]:
+    """
+    Inserts submissions in a single transaction.
+
+    Records whose submission_id is already stored are skipped, so replaying
+    the same records is harmless.
+
+    Args:
+        records (List[Dict]): final_data payloads.
+        db_path (str): SQLite database path.
+
+    Returns:
+        List[Optional[int]]: Row id assigned to each record, in order
+        (None for skipped duplicates).
+
+    Raises:
+        sqlite3.Error: On any database failure; nothing is committed.
+    """
+    if not records:
+        return []
+    conn = get_connection(db_path)
+    placeholders = ", ".join("?" for _ in range(len(SUBMISSION_COLUMNS) + 2))
+    sql = (
+        f"INSERT OR IGNORE INTO submissions ({', '.join(SUBMISSION_COLUMNS)}, specific_data, extra_data) "
+        f"VALUES ({placeholders})"
+    )
+    ids = []
+    with timed("save_to_database"), conn:
+        for data in records:
+            cursor = conn.execute(sql, _to_row(data))
+            ids.append(cursor.lastrowid if cursor.rowcount else None)
+    return ids
+
+def _as_timestamp(value: Union[str, date, datetime]) -> str:
+    """Formats a bound the same way final_data['timestamp'] is stored."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+def iter_submissions(
+    db_path: str = DEFAULT_DB,
+    cluster_macro: Optional[str] = None,
+    niche: Optional[str] = None,
+    cnpj: Optional[str] = None,
+    email: Optional[str] = None,
+    since: Optional[Union[str, date, datetime]] = None,
+    until: Optional[Union[str, date, datetime]] = None,
+    limit: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields stored submissions matching the filters, oldest first.
+
+    Every filter maps to an indexed column. 'since' is inclusive and
+    'until' is exclusive, both compared against the submission timestamp.
+    """
+    clauses, params = [], []
+    for column, value in (("cluster_macro", cluster_macro), ("niche", niche), ("cnpj", cnpj), ("email", email)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(_as_timestamp(since))
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(_as_timestamp(until))
+
+    sql = "SELECT * FROM submissions"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+
+    for row in get_connection(db_path).execute(sql, params):
+        yield _to_record(row)
+
+def query_submissions(db_path: str = DEFAULT_DB, **filters: Any) -> List[Dict[str, Any]]:
+    """List version of iter_submissions."""
+    return list(iter_submissions(db_path, **filters))
+
+def count_submissions(db_path: str = DEFAULT_DB) -> int:
+    """Returns the number of stored submissions."""
+    return get_connection(db_path).execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+
+def store_version(db_path: str = DEFAULT_DB) -> int:
+    """
+    Returns a cheap change marker for the store (the highest row id).
+
+    Submissions are append-only, so the marker only moves when rows are
+    added; caches keyed on it are invalidated exactly then.
+    """
+    return get_connection(db_path).execute("SELECT COALESCE(MAX(id), 0) FROM submissions").fetchone()[0]
+
+def load_submissions_frame(db_path: str = DEFAULT_DB) -> pd.DataFrame:
+    """
+    Loads every submission into a DataFrame, specific_data flattened into columns.
+
+    Boolean tech_* flags come back as bool and 'timestamp' as datetime64.
+    """
+    conn = get_connection(db_path)
+    df = pd.read_sql_query("SELECT * FROM submissions ORDER BY id", conn)
+    if df.empty:
+        return df.drop(columns=["specific_data", "extra_data"])
+
+    specific = pd.json_normalize([json.loads(s) for s in df.pop("specific_data")])
+    df = df.drop(columns=["extra_data"])
+    specific = specific.drop(columns=[c for c in specific.columns if c in df.columns])
+    df = pd.concat([df, specific.set_index(df.index)], axis=1)
+
+    for column in BOOLEAN_COLUMNS:
+        df[column] = df[column].fillna(0).astype(bool)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    return df
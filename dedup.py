@@ -0,0 +1,181 @@
+import re
+import threading
+import unicodedata
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from database import DEFAULT_DB, get_connection
+
+# ==========================================
+# DUPLICATE-STARTUP DETECTION
+# ==========================================
+
+@dataclass
+class DuplicateMatch:
+    """A stored submission that looks like the one being filled in."""
+    submission_id: int
+    startup_name: str
+    product_name: str
+    reason: str
+    score: float
+
+def normalize_cnpj(cnpj: Optional[str]) -> str:
+    """Keeps only digits: '12.345.678/0001-90' -> '12345678000190'."""
+    return re.sub(r"\D", "", cnpj or "")
+
+def normalize_email(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
+
+def normalize_name(name: Optional[str]) -> str:
+    """Folds accents, case and punctuation/spaces: 'b-Med Health' -> 'bmedhealth'."""
+    folded = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]", "", folded.lower())
+
+def trigrams(normalized: str) -> Set[str]:
+    """Character trigrams, padded so short names still produce some."""
+    if not normalized:
+        return set()
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class DuplicateIndex:
+    """
+    In-memory exact (CNPJ, e-mail) and trigram (startup/product name) index.
+
+    Built once from the SQLite store, then kept current by add() on each
+    save and by refresh(), which pulls only rows with a higher id. Trigram
+    postings are typed arrays of submission ids, so a lookup counts shared
+    trigrams for every candidate with a single numpy bincount.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._names: Dict[int, tuple] = {}
+        self._by_cnpj: Dict[str, Set[int]] = defaultdict(set)
+        self._by_email: Dict[str, Set[int]] = defaultdict(set)
+        # One trigram index per name field (0 = startup, 1 = product):
+        # trigram -> ids, and trigram-set size per id (position = id)
+        self._postings = (defaultdict(lambda: array("I")), defaultdict(lambda: array("I")))
+        self._gram_counts = (array("H"), array("H"))
+
+    def add(self, submission_id: int, startup_name: str, product_name: str, cnpj: str, email: str) -> None:
+        """Indexes one submission (idempotent per id)."""
+        with self._lock:
+            self._add(submission_id, startup_name, product_name, cnpj, email)
+
+    def _add(self, submission_id, startup_name, product_name, cnpj, email) -> None:
+        if submission_id in self._names:
+            return
+        self._names[submission_id] = (startup_name or "", product_name or "")
+        if normalize_cnpj(cnpj):
+            self._by_cnpj[normalize_cnpj(cnpj)].add(submission_id)
+        if normalize_email(email):
+            self._by_email[normalize_email(email)].add(submission_id)
+        for field, name in enumerate((startup_name, product_name)):
+            grams = trigrams(normalize_name(name))
+            counts = self._gram_counts[field]
+            if len(counts) <= submission_id:
+                counts.extend([0] * (submission_id + 1 - len(counts)))
+            counts[submission_id] = min(len(grams), 0xFFFF)
+            for gram in grams:
+                self._postings[field][gram].append(submission_id)
+        self._last_id = max(self._last_id, submission_id)
+
+    def refresh(self) -> None:
+        """Pulls submissions stored since the last refresh (by any process)."""
+        rows = get_connection(self.db_path).execute(
+            "SELECT id, startup_name, product_name, cnpj, email FROM submissions WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        ).fetchall()
+        with self._lock:
+            for row in rows:
+                self._add(*row)
+
+    def _name_scores(self, grams: Set[str], field: int, threshold: float) -> Dict[int, float]:
+        """Dice coefficient against one stored name field, for ids reaching the threshold."""
+        postings = self._postings[field]
+        arrays = [np.frombuffer(postings[g], dtype=np.uint32) for g in grams if g in postings]
+        if not arrays:
+            return {}
+        shared = np.bincount(np.concatenate(arrays))
+        sizes = np.frombuffer(self._gram_counts[field], dtype=np.uint16)[:len(shared)]
+        dice = 2.0 * shared / (len(grams) + sizes)
+        hits = np.flatnonzero(dice >= threshold)
+        return dict(zip(hits.tolist(), dice[hits].tolist()))
+
+    def find(
+        self,
+        startup_name: str = "",
+        product_name: str = "",
+        cnpj: str = "",
+        email: str = "",
+        limit: int = 5,
+        threshold: float = 0.6,
+    ) -> List[DuplicateMatch]:
+        """
+        Returns likely duplicates, best first.
+
+        Exact CNPJ or e-mail hits score 1.0. Each given name is compared with
+        both stored names (startups often swap them) using the Dice
+        coefficient over character trigrams; the best must reach 'threshold'.
+        """
+        scores: Dict[int, float] = {}
+        reasons: Dict[int, str] = {}
+        with self._lock:
+            for key, table, reason in (
+                (normalize_cnpj(cnpj), self._by_cnpj, "CNPJ"),
+                (normalize_email(email), self._by_email, "E-mail"),
+            ):
+                for submission_id in table.get(key, ()) if key else ():
+                    scores[submission_id] = 1.0
+                    reasons.setdefault(submission_id, reason)
+
+            for name in {normalize_name(startup_name), normalize_name(product_name)} - {""}:
+                grams = trigrams(name)
+                for field in (0, 1):
+                    for submission_id, dice in self._name_scores(grams, field, threshold).items():
+                        if dice > scores.get(submission_id, 0.0):
+                            scores[submission_id] = dice
+                            reasons.setdefault(submission_id, "Nome semelhante")
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            return [
+                DuplicateMatch(sid, *self._names[sid], reason=reasons[sid], score=round(score, 3))
+                for sid, score in ranked
+            ]
+
+_index: Optional[DuplicateIndex] = None
+_index_lock = threading.Lock()
+
+def get_duplicate_index(db_path: str = DEFAULT_DB) -> DuplicateIndex:
+    """Returns the process-wide index, building it from the store on first use."""
+    global _index
+    with _index_lock:
+        if _index is None or _index.db_path != db_path:
+            _index = DuplicateIndex(db_path)
+        index = _index
+    index.refresh()
+    return index
+
+def index_submissions(ids: List[int], records: List[Dict]) -> None:
+    """Adds freshly saved submissions to the shared index, if it has been built."""
+    index = _index
+    if index is None:
+        return
+    for submission_id, data in zip(ids, records):
+        if submission_id is None:
+            continue
+        index.add(
+            submission_id, data.get("startup_name"), data.get("product_name"),
+            data.get("cnpj"), data.get("email"),
+        )
+
+def find_duplicates(startup_name: str, product_name: str, cnpj: str, email: str, **kwargs) -> List[DuplicateMatch]:
+    """Convenience wrapper around the shared index."""
+    return get_duplicate_index().find(startup_name, product_name, cnpj, email, **kwargs)
@@ -0,0 +1,201 @@
+"""
+Durable append-only JSONL writer with group commit.
+
+Concurrent callers hand over their serialized lines; whichever caller
+finds no flush in progress becomes the leader, writes every pending line
+with one write() and one fsync(), then wakes the others. A caller returns
+only after the fsync covering its lines has completed, so an
+acknowledged record survives a crash while peak-time submits share the
+fsync cost instead of paying it one by one.
+
+On open, a recovery pass truncates a torn trailing line (a partial write
+or the zero-filled tail some filesystems leave after a crash).
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import fcntl  # POSIX only: serializes writers from other processes
+except ImportError:
+    fcntl = None
+
+from metrics import add_bytes, timed
+
+RECOVERY_WINDOW = 1024 * 1024  # bytes inspected from the end of the file
+
+# ==========================================
+# CRASH RECOVERY
+# ==========================================
+
+def _is_valid_line(line: bytes) -> bool:
+    try:
+        json.loads(line)
+        return True
+    except ValueError:
+        return False
+
+def recover_tail(path: str) -> int:
+    """
+    Truncates torn or corrupt lines from the end of a JSONL file.
+
+    Only the trailing region is inspected; records before the last valid
+    line are never touched. The check and the truncate run under the same
+    exclusive flock the writers take, so a line another process is
+    appending at that moment is never mistaken for a torn one.
+
+    Returns:
+        int: Number of bytes removed.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = max(0, size - RECOVERY_WINDOW)
+        f.seek(start)
+        tail = f.read()
+        keep = len(tail)
+        while keep:
+            body = tail[:keep]
+            if not body.endswith(b"\n"):
+                cut = body.rfind(b"\n") + 1  # drop the unterminated fragment
+            else:
+                line_start = body.rfind(b"\n", 0, keep - 1) + 1
+                line = body[line_start:keep]
+                if line.strip(b"\x00\r\n ") and _is_valid_line(line):
+                    break
+                if line_start == 0 and start > 0:
+                    break  # line extends past the window; leave it alone
+                cut = line_start
+            keep = cut
+        removed = len(tail) - keep
+        if removed:
+            f.truncate(start + keep)
+            f.flush()
+            os.fsync(f.fileno())
+    return removed
+
+# ==========================================
+# GROUP-COMMIT WRITER
+# ==========================================
+
+class _PendingAppend:
+    __slots__ = ("payload", "done", "error")
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+class DurableJsonlWriter:
+    """Keeps one O_APPEND descriptor open and fsyncs once per group of appends."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recovered_bytes = recover_tail(path)
+        existed = os.path.exists(path)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        if not existed:
+            _fsync_directory(path)
+        self._cond = threading.Condition()
+        self._pending: List[_PendingAppend] = []
+        self._flushing = False
+
+    def append(self, payload: bytes) -> None:
+        """
+        Appends newline-terminated JSON lines and waits until they are durable.
+
+        Raises:
+            OSError: If the write or fsync covering these lines failed.
+        """
+        if not payload:
+            return
+        request = _PendingAppend(payload)
+        with self._cond:
+            self._pending.append(request)
+            while not request.done:
+                if self._flushing:
+                    self._cond.wait()
+                else:
+                    self._flush_pending()
+        if request.error is not None:
+            raise request.error
+
+    def _flush_pending(self) -> None:
+        """Leader path: called with the condition held, releases it during I/O."""
+        self._flushing = True
+        group, self._pending = self._pending, []
+        self._cond.release()
+        error = None
+        try:
+            data = b"".join(request.payload for request in group)
+            with timed("jsonl_group_commit"):
+                self._write_locked(data)
+            add_bytes("jsonl", len(data))
+        except BaseException as e:
+            error = e
+        finally:
+            self._cond.acquire()
+        for request in group:
+            request.error = error
+            request.done = True
+        self._flushing = False
+        self._cond.notify_all()
+
+    def _write_locked(self, data: bytes) -> None:
+        """One write + fsync; a failed group is cut back off so no torn line stays behind."""
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._fd).st_size
+            try:
+                view = memoryview(data)
+                while view:
+                    written = os.write(self._fd, view)
+                    view = view[written:]
+                os.fsync(self._fd)
+            except OSError:
+                try:
+                    os.ftruncate(self._fd, size)
+                except OSError:
+                    pass  # recover_tail() cleans up on the next start
+                raise
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            os.close(self._fd)
+
+def _fsync_directory(path: str) -> None:
+    """Makes a newly created file's directory entry durable (no-op where unsupported)."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+_writers: Dict[str, DurableJsonlWriter] = {}
+_writers_lock = threading.Lock()
+
+def get_durable_writer(path: str) -> DurableJsonlWriter:
+    """Returns the process-wide writer for a file, running recovery on first use."""
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = DurableJsonlWriter(path)
+        return writer
@@ -0,0 +1,362 @@
+"""
+STREAMING EXCEL EXPORT b-Med
+----------------------------
+Builds the per-cluster workbook from bmed_submissions.jsonl in constant
+memory. Records are decoded once; each row is serialized straight to a
+per-sheet SpreadsheetML spool on disk, and the package itself (workbook,
+styles, header rows) is produced by openpyxl's write-only mode. The spools
+are then spliced into the sheets while zipping, so no sheet, cell object
+or DataFrame is ever held in memory.
+
+Without --out the export goes to a new bmed_export_<timestamp>.xlsx, never
+to the reviewers' live workbook; a filtered export into it is refused.
+
+Usage:
+    python excel_export.py --out export.xlsx
+    python excel_export.py --since 2024-01-01 --until 2024-07-01 --niche "Telemedicina"
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import fcntl  # POSIX only: serializes rebuilds from other processes
+except ImportError:
+    fcntl = None
+from xml.sax.saxutils import escape
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+
+from jsonl_index import get_submission_log
+from metrics import timed
+from submission_log import canonical_path
+from utils import _flatten_submission, _sheet_name_for
+
+# Environment switches:
+#   BMED_EXCEL_REBUILD_INTERVAL  minimum seconds between two background rebuilds (default 300)
+REBUILD_INTERVAL = float(os.environ.get("BMED_EXCEL_REBUILD_INTERVAL", "300"))
+
+SPOOL_CHUNK = 1024 * 1024
+_ROWS_END = "</sheetData>"
+
+# ==========================================
+# PER-SHEET ROW SPOOL
+# ==========================================
+
+class _SheetSpool:
+    """
+    Serializes rows for one sheet into a temp file as <row> elements.
+
+    Columns are numbered in first-seen key order, the order the old
+    per-submission save grew a sheet's header row in.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self.columns: Dict[str, int] = {}
+        self.letters: List[str] = []
+        self.rows = 1  # row 1 is the header
+
+    def append(self, flat_data: Dict[str, Any]) -> None:
+        self.rows += 1
+        row = str(self.rows)
+        cells = []
+        for key, value in flat_data.items():
+            index = self.columns.get(key)
+            if index is None:
+                index = self.columns[key] = len(self.columns)
+                self.letters.append(get_column_letter(index + 1))
+            if value is not None:
+                cells.append((index, _cell_xml(self.letters[index] + row, value)))
+        cells.sort()  # Excel requires cells in column order; key order varies per record
+        self.file.write(f'<row r="{row}">{"".join(xml for _, xml in cells)}</row>')
+
+    def copy_to(self, out) -> None:
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(SPOOL_CHUNK)
+            if not chunk:
+                break
+            out.write(chunk.encode("utf-8"))
+
+    def close(self) -> None:
+        self.file.close()
+
+def _cell_xml(ref: str, value: Any) -> str:
+    """One <c> element; same conversions as _write_cell, dates as ISO text."""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False)
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    text = escape(ILLEGAL_CHARACTERS_RE.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+# ==========================================
+# WORKBOOK ASSEMBLY
+# ==========================================
+
+def _assemble(spools: Dict[str, _SheetSpool], filename: str) -> None:
+    """Writes the header-only write-only workbook, then splices each spool into its sheet."""
+    skeleton = f"{filename}.skeleton.xlsx"
+    wb = Workbook(write_only=True)
+    for sheet_name, spool in spools.items():
+        wb.create_sheet(sheet_name).append(list(spool.columns))
+    wb.save(skeleton)
+
+    # openpyxl numbers write-only sheets by creation order
+    sheet_parts = {f"xl/worksheets/sheet{i}.xml": spool for i, spool in enumerate(spools.values(), start=1)}
+    tmp_filename = f"{filename}.tmp.xlsx"
+    try:
+        with zipfile.ZipFile(skeleton) as src, \
+                zipfile.ZipFile(tmp_filename, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as dst:
+            for item in src.infolist():
+                spool = sheet_parts.get(item.filename)
+                if spool is None:
+                    with src.open(item) as part, dst.open(item.filename, "w") as out:
+                        shutil.copyfileobj(part, out)
+                    continue
+                head, tail = src.read(item).decode("utf-8").split(_ROWS_END, 1)
+                with dst.open(item.filename, "w", force_zip64=True) as out:
+                    out.write(head.encode("utf-8"))
+                    spool.copy_to(out)
+                    out.write((_ROWS_END + tail).encode("utf-8"))
+        os.replace(tmp_filename, filename)
+    finally:
+        for path in (skeleton, tmp_filename):
+            if os.path.exists(path):
+                os.remove(path)
+
+def write_workbook(records: Iterable[Dict[str, Any]], filename: str) -> int:
+    """
+    Streams submissions into a per-cluster workbook, replacing 'filename' atomically.
+
+    Args:
+        records (Iterable[Dict]): Submission payloads, consumed once.
+        filename (str): Target .xlsx path.
+
+    Returns:
+        int: Number of exported submissions (the file is left untouched when 0).
+
+    Raises:
+        Exception: Any I/O or openpyxl error; callers decide how to report it.
+    """
+    spools: Dict[str, _SheetSpool] = {}
+    exported = 0
+    try:
+        for data in records:
+            flat_data = _flatten_submission(data)
+            sheet_name = _sheet_name_for(flat_data)
+            spool = spools.get(sheet_name)
+            if spool is None:
+                spool = spools[sheet_name] = _SheetSpool()
+            spool.append(flat_data)
+            exported += 1
+        if exported:
+            _assemble(spools, filename)
+    finally:
+        for spool in spools.values():
+            spool.close()
+    return exported
+
+def export_jsonl_to_excel(
+    filename: str = "bmed_startups_database.xlsx",
+    jsonl_filename: str = "bmed_submissions.jsonl",
+    since: Optional[Union[str, date, datetime]] = None,
+    until: Optional[Union[str, date, datetime]] = None,
+    niche: Optional[str] = None,
+    cluster_macro: Optional[str] = None,
+) -> int:
+    """
+    Exports the JSONL submission history to a per-cluster Excel workbook.
+
+    Filtering uses the JSONL key index, so only matching lines are decoded.
+
+    Args:
+        filename (str): Target .xlsx path.
+        jsonl_filename (str): Submission history to read.
+        since (str | date): Inclusive lower bound on the submission timestamp.
+        until (str | date): Exclusive upper bound on the submission timestamp.
+        niche (str): Only export this niche.
+        cluster_macro (str): Only export this cluster.
+
+    Returns:
+        int: Number of exported submissions.
+    """
+    records = get_submission_log(jsonl_filename).filter(
+        cluster_macro=cluster_macro, niche=niche, since=since, until=until,
+    )
+
+    def strip_ids() -> Iterator[Dict[str, Any]]:
+        for record in records:
+            record.pop("_id", None)
+            yield record
+
+    with timed("export_excel"):
+        return write_workbook(strip_ids(), filename)
+
+# ==========================================
+# BACKGROUND REBUILD (THE WORKBOOK IS DERIVED FROM THE JSONL)
+# ==========================================
+
+_workbook_locks: Dict[str, threading.Lock] = {}
+_workbook_locks_guard = threading.Lock()
+
+@contextmanager
+def workbook_lock(filename: str) -> Iterator[None]:
+    """
+    Serializes writers of one workbook: a thread lock in this process plus
+    an flock on '<file>.lock' across processes (app replicas, bulk imports).
+    """
+    key = os.path.abspath(filename)
+    with _workbook_locks_guard:
+        lock = _workbook_locks.setdefault(key, threading.Lock())
+    with lock:
+        fd = os.open(key + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # also releases the flock
+
+def rebuild_workbook(
+    filename: str = "bmed_startups_database.xlsx",
+    jsonl_filename: str = "bmed_submissions.jsonl",
+) -> int:
+    """
+    Regenerates the whole workbook from the JSONL history.
+
+    The new file is assembled next to the old one and swapped in with
+    os.replace, all under workbook_lock(), so readers never see a partial
+    workbook and concurrent rebuilds never share temp files.
+
+    Returns:
+        int: Number of exported submissions.
+    """
+    with workbook_lock(filename):
+        return export_jsonl_to_excel(filename, jsonl_filename)
+
+class WorkbookRebuilder:
+    """
+    Rebuilds a workbook from the JSONL in a background thread, on a schedule.
+
+    request() returns a Future resolved by the first rebuild that starts
+    after the call, so every record already in the JSONL is in the file by
+    then. A rebuild costs O(history), so rebuilds start at most once per
+    REBUILD_INTERVAL however many batches arrive; an idle workbook is
+    rebuilt right away. flush() runs a pending rebuild on demand (shutdown,
+    tests). The workbook is derived data: a rebuild replaces the file, so
+    anything reviewers add to it by hand is not kept.
+    """
+
+    def __init__(self, filename: str, jsonl_filename: str, interval: float = REBUILD_INTERVAL):
+        self.filename = filename
+        self.jsonl_filename = jsonl_filename
+        self.interval = interval
+        self._last_start: Optional[float] = None
+        self._cond = threading.Condition()
+        self._pending: List[Future] = []
+        self._rebuilding = False
+        self._hurry = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bmed-excel-rebuild", daemon=True)
+        self._thread.start()
+
+    def request(self) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._pending.append(future)
+            self._cond.notify()
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Runs a pending rebuild right away and waits for it (no-op when idle)."""
+        with self._cond:
+            if not self._pending and not self._rebuilding:
+                return
+        future = self.request()
+        self._hurry.set()
+        try:
+            future.result(timeout)
+        except Exception:
+            pass  # the rebuild's own requesters receive the error
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            if self._last_start is not None:
+                self._hurry.wait(max(0.0, self._last_start + self.interval - time.monotonic()))
+            self._hurry.clear()
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._rebuilding = True
+            self._last_start = time.monotonic()
+            try:
+                rebuild_workbook(self.filename, self.jsonl_filename)
+            except Exception as e:
+                for future in batch:
+                    future.set_exception(e)
+            else:
+                for future in batch:
+                    future.set_result(True)
+            finally:
+                with self._cond:
+                    self._rebuilding = False
+
+_rebuilders: Dict[str, WorkbookRebuilder] = {}
+_rebuilders_lock = threading.Lock()
+
+def get_workbook_rebuilder(
+    filename: str = "bmed_startups_database.xlsx",
+    jsonl_filename: str = "bmed_submissions.jsonl",
+) -> WorkbookRebuilder:
+    """Returns the process-wide rebuilder for a workbook, starting it on first use."""
+    key = os.path.abspath(filename)
+    with _rebuilders_lock:
+        if key not in _rebuilders:
+            _rebuilders[key] = WorkbookRebuilder(filename, jsonl_filename)
+        return _rebuilders[key]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jsonl", default=canonical_path("bmed_submissions.jsonl"), help="Submission history (JSONL).")
+    parser.add_argument("--out", help="Target workbook (default: bmed_export_<timestamp>.xlsx).")
+    parser.add_argument("--since", help="Inclusive start date (YYYY-MM-DD).")
+    parser.add_argument("--until", help="Exclusive end date (YYYY-MM-DD).")
+    parser.add_argument("--niche", help="Only export this niche.")
+    parser.add_argument("--cluster", help="Only export this cluster_macro.")
+    args = parser.parse_args()
+    if args.out is None:
+        args.out = f"bmed_export_{datetime.now():%Y%m%d_%H%M%S}.xlsx"
+    filtered = any((args.since, args.until, args.niche, args.cluster))
+    live = os.path.abspath(canonical_path("bmed_startups_database.xlsx"))
+    if filtered and os.path.abspath(args.out) == live:
+        parser.error("um export filtrado não pode substituir a planilha completa dos revisores; use outro --out")
+
+    start = time.perf_counter()
+    with workbook_lock(args.out):
+        exported = export_jsonl_to_excel(
+            args.out, args.jsonl, since=args.since, until=args.until, niche=args.niche, cluster_macro=args.cluster,
+        )
+    print(f"{exported} submissões exportadas para {args.out} em {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,135 +1,90 @@
 import streamlit as st
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Mapping, Optional, Sequence
 
-def render_cluster_questions(target_cluster: str) -> Dict[str, Any]:
+from taxonomy import get_taxonomy
+from upload_spool import spooled_file_uploader
+
+# ==========================================
+# SCHEMA-DRIVEN CLUSTER QUESTIONS
+# ==========================================
+
+def _widget_kwargs(item: Mapping[str, Any]) -> Dict[str, Any]:
+    """Passes 'key' only when the schema sets one, so unkeyed widgets keep label-based identity."""
+    return {"key": item["key"]} if item.get("key") else {}
+
+def _text(render: Callable[[str], Any]) -> Callable[[Mapping[str, Any]], Any]:
+    return lambda item: render(item["text"])
+
+# Input widgets: item -> value
+_INPUTS: Dict[str, Callable[[Mapping[str, Any]], Any]] = {
+    "selectbox": lambda item: st.selectbox(item["label"], item["options"], **_widget_kwargs(item)),
+    "radio": lambda item: st.radio(item["label"], item["options"], **_widget_kwargs(item)),
+    "text_input": lambda item: st.text_input(item["label"], **_widget_kwargs(item)),
+    "text_area": lambda item: st.text_area(item["label"], height=item.get("height"), **_widget_kwargs(item)),
+    "checkbox": lambda item: st.checkbox(item["label"], **_widget_kwargs(item)),
+    "date_input": lambda item: st.date_input(item["label"], **_widget_kwargs(item)),
+    "file": lambda item: spooled_file_uploader(item["label"], item["slot"], type=list(item["accept"]) or None),
+}
+
+# Static text: item -> None
+_TEXTS: Dict[str, Callable[[Mapping[str, Any]], Any]] = {
+    "markdown": _text(st.markdown),
+    "info": _text(st.info),
+    "warning": _text(st.warning),
+    "caption": _text(st.caption),
+}
+
+def _render_items(items: Sequence[Mapping[str, Any]], values: Dict[str, Any], specific_data: Dict[str, Any]) -> None:
+    """
+    Renders a compiled item list.
+
+    'values' holds every answer by field or name so later 'branch' items can
+    test it; only items with a 'field' are stored in specific_data.
+    """
+    for item in items:
+        kind = item["type"]
+        if kind in _TEXTS:
+            _TEXTS[kind](item)
+        elif kind in _INPUTS:
+            value = _INPUTS[kind](item)
+            values[item.get("field") or item["name"]] = value
+            if item.get("field"):
+                specific_data[item["field"]] = value
+        elif kind == "columns":
+            for column, column_items in zip(st.columns(list(item["widths"])), item["items"]):
+                with column:
+                    _render_items(column_items, values, specific_data)
+        elif kind == "branch":
+            current = values.get(item["on"])
+            chosen = next((case["items"] for case in item["cases"] if current in case["in"]), item["default"])
+            _render_items(chosen, values, specific_data)
+        elif kind == "value":
+            specific_data[item["field"]] = item.get("value")
+
+def render_cluster_questions(target_cluster: str, revision: Optional[str] = None) -> Dict[str, Any]:
     """
     Renders specific form fields based on the selected Cluster.
-    
+
+    The questions come from the cluster's schema in taxonomy.json.
+
     Args:
         target_cluster (str): The name of the selected macro cluster.
-        
+        revision (Optional[str]): Taxonomy revision the session started with;
+            keeps the form stable if the definition is reloaded mid-session.
+
     Returns:
         Dict[str, Any]: A dictionary containing the collected specific data.
     """
     specific_data = {}
-    
+
     st.markdown("### 4. Detalhamento Específico da Solução")
     st.caption(f"Perguntas baseadas no grupo: {target_cluster}")
 
-    # --- CLUSTER A: GESTÃO E FLUXO ---
-    if target_cluster == "Ferramentas de Gestão e Fluxo":
-        with st.expander("Detalhes: Gestão e Fluxo", expanded=True):
-            st.markdown("**Interoperabilidade**")
-            specific_data['integration_type'] = st.selectbox(
-                "Tipo de Integração:", 
-                ["Não tem/CSV", "API Proprietária", "Padrão HL7 FHIR/v2"]
-            )
-            specific_data['vocabularies'] = st.selectbox(
-                "Vocabulários Controlados:", 
-                ["Texto Livre", "TUSS/TISS/CID/SNOMED"]
-            )
-            
-            st.markdown("**Usabilidade & Estabilidade**")
-            specific_data['click_count'] = st.selectbox(
-                "Cliques para tarefa simples (Ex: Prescrição):", 
-                ["> 10 cliques", "6-9 cliques", "< 5 cliques"]
-            )
-            specific_data['rto_rpo'] = st.selectbox(
-                "Política de Backup/Recuperação:", 
-                ["Backup Diário", "Tempo Real / Failover Automático"]
-            )
-
-    # --- CLUSTER B: SUPORTE À DIAGNÓSTICO ---
-    elif target_cluster == "Suporte à Diagnóstico e Conduta":
-        with st.expander("Detalhes: Suporte à Diagnóstico (Passo a Passo)", expanded=True):
-            st.markdown("#### 1. Finalidade do Software (Intended Use)")
-            st.info("Para que serve a informação fornecida pelo software?")
-            
-            specific_data['sd_intended_use'] = st.radio(
-                "Finalidade Principal:", 
-                [
-                    "Tratar ou Diagnosticar (Treat or Diagnose)",
-                    "Auxiliar/Direcionar Conduta (Drive Clinical Management)",
-                    "Fornecer Informação Clínica (Inform Clinical Management)"
-                ], 
-                key="sd_use"
-            )
-            
-            st.markdown("#### 2. Criticidade da Situação")
-            st.info("Qual o estado de saúde do paciente alvo?")
-            specific_data['sd_criticality'] = st.radio(
-                "Situação de Saúde:",
-                [
-                    "Crítica (Risco iminente de morte ou deterioração irreversível)",
-                    "Séria (Requer intervenção oportuna, mas não imediata)",
-                    "Não Séria (Condição leve ou gestão de bem-estar)"
-                ], 
-                key="sd_crit"
-            )
-
-            st.markdown("#### 3. Regulação e Validação")
-            col_v1, col_v2 = st.columns(2)
-            with col_v1:
-                specific_data['validation_type'] = st.selectbox(
-                    "Tipo de Validação realizada:", 
-                    ["Nenhuma", "Validação Interna (Dados Retrospectivos)", "Validação Prospectiva", "Validação Externa"]
-                )
-            with col_v2: 
-                specific_data['samd_class'] = st.selectbox(
-                    "Classe de Risco Estimada (ANVISA/MDR):", 
-                    ["Classe I (Baixo)", "Classe II (Médio)", "Classe III (Alto)", "Classe IV (Máximo)"]
-                )
-
-    # --- CLUSTER C: TERAPÊUTICAS DIGITAIS ---
-    elif target_cluster == "Terapêuticas Digitais e Reabilitação":
-        with st.expander("Detalhes: Terapêuticas Digitais", expanded=True):
-            # 1. Evidência Clínica
-            st.markdown("##### 1. Evidência Clínica")
-            clinical_evidence = st.radio(
-                "Selecione o nível de evidência disponível:", 
-                ["Ensaio Clínico Randomizado (ECR)", "Estudo Pré e Pós utilização", "Estudo Piloto", "Não possuo evidência estruturada"],
-                key="td_evidence"
-            )
-            specific_data['clinical_evidence'] = clinical_evidence
-
-            if clinical_evidence in ["Ensaio Clínico Randomizado (ECR)", "Estudo Pré e Pós utilização"]:
-                col_doi, col_file = st.columns(2)
-                with col_doi:
-                    specific_data['study_doi'] = st.text_input("DOI do Estudo/Artigo (Link ou ID):")
-                with col_file:
-                    specific_data['study_file'] = st.file_uploader("Ou anexe o PDF do Estudo Completo:", type=['pdf'])
-            
-            elif clinical_evidence == "Estudo Piloto":
-                st.warning("Para Estudo Piloto, é necessário o projeto de pesquisa.")
-                specific_data['study_file'] = st.file_uploader("Anexar Projeto Submetido ao CEP/CONEP:", type=['pdf'])
-            
-            st.markdown("---")
-            
-            # 2. Responsabilidade Técnica
-            st.markdown("##### 2. Responsabilidade Técnica / Conteúdo")
-            has_prof = st.checkbox("O conteúdo é assinado/supervisionado por profissional de saúde?", key="td_has_prof")
-            
-            if has_prof:
-                col_p1, col_p2, col_p3 = st.columns([2, 1, 1])
-                with col_p1:
-                    specific_data['prof_name'] = st.text_input("Nome do Profissional Responsável:")
-                with col_p2:
-                    specific_data['prof_council_type'] = st.selectbox("Conselho:", ["CRM", "COREN", "CREFITO", "CRP", "CRO", "CRN", "Outros"])
-                with col_p3:
-                    specific_data['prof_council_num'] = st.text_input("Nº Registro / UF:")
-            else:
-                specific_data['prof_council'] = "Não aplicável"
-
-            # 3. Engajamento
-            st.markdown("##### 3. Modelo de Engajamento")
-            specific_data['engagement_process'] = st.text_area("Descreva a estratégia de engajamento do paciente:", height=80)
-
-            # 4. Monetização
-            st.markdown("##### 4. Modelo de Negócio")
-            specific_data['monetization_process'] = st.text_area("Como é o processo de monetização?", height=80)
-
-            # 5. UX/UI
-            st.markdown("##### 5. UX/UI")
-            specific_data['last_layout_update'] = st.date_input("Data da última atualização de Interface:")
+    schema = get_taxonomy(revision).schemas.get(target_cluster)
+    if schema is None:
+        return specific_data
+
+    with st.expander(schema.title, expanded=True):
+        _render_items(schema.items, {}, specific_data)
 
     return specific_data
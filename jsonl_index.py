@@ -0,0 +1,248 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, Optional, Union
+
+try:
+    import fcntl  # POSIX only: serializes index updates from other processes
+except ImportError:
+    fcntl = None
+
+# ==========================================
+# OFFSET-INDEXED READER FOR THE JSONL BACKUP
+# ==========================================
+
+# One fixed-width entry per record in <file>.idx2: byte offset + line length
+# + end of the record's line in <file>.keys, so the two sidecars can be
+# realigned after a crash between their writes (the old 12-byte <file>.idx
+# could not tell how far .keys had got)
+_ENTRY = struct.Struct("<QIQ")
+# Key fields mirrored in <file>.keys (one JSON array per record, same order)
+KEY_FIELDS = ("cluster_macro", "niche", "cnpj", "timestamp")
+
+class SubmissionLog:
+    """
+    Read-only view over bmed_submissions.jsonl backed by sidecar indexes.
+
+    Record ids are 0-based line ordinals. refresh() indexes only the bytes
+    appended since the last call; lookups then decode just the matching
+    lines out of a memory map, so scans run in constant memory.
+    """
+
+    def __init__(self, filename: str = "bmed_submissions.jsonl"):
+        self.filename = filename
+        self.idx_path = filename + ".idx2"
+        self.keys_path = filename + ".keys"
+        self._lock = threading.Lock()
+
+    # --- Index maintenance ---
+
+    def _align(self) -> int:
+        """
+        Cuts both sidecars back to the last record present in both.
+
+        A refresh interrupted between the two appends leaves one file
+        ahead; the last complete .idx2 entry whose .keys line was fully
+        written marks where both are cut, and indexing resumes from there.
+
+        Returns:
+            int: Byte offset in the data file right after the last indexed line.
+        """
+        keys_size = os.path.getsize(self.keys_path) if os.path.exists(self.keys_path) else 0
+        offset = keys_end = 0
+        if not os.path.exists(self.idx_path) and os.path.exists(self.filename + ".idx"):
+            os.remove(self.filename + ".idx")  # pre-realignment format, rebuilt from scratch
+        if os.path.exists(self.idx_path):
+            with open(self.idx_path, "r+b") as idx:
+                size = os.fstat(idx.fileno()).st_size
+                count = size // _ENTRY.size
+                while count:
+                    idx.seek((count - 1) * _ENTRY.size)
+                    data_offset, length, keys_end = _ENTRY.unpack(idx.read(_ENTRY.size))
+                    if keys_end <= keys_size:
+                        offset = data_offset + length
+                        break
+                    count -= 1
+                else:
+                    keys_end = 0
+                if count * _ENTRY.size != size:
+                    idx.truncate(count * _ENTRY.size)
+        if keys_size != keys_end:
+            with open(self.keys_path, "r+b") as keys:
+                keys.truncate(keys_end)
+        return offset
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Serializes refreshes of these sidecars across threads and processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.idx_path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reset(self) -> None:
+        for path in (self.idx_path, self.keys_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def refresh(self) -> int:
+        """
+        Indexes records appended since the last refresh.
+
+        A trailing line without its newline is left for the next call, an
+        interrupted earlier refresh is cut back to its last complete record,
+        and an index that points past the end of the data file (the backup
+        was replaced or truncated) is rebuilt from scratch.
+
+        Returns:
+            int: Number of newly indexed records.
+        """
+        with self._file_lock():
+            if not os.path.exists(self.filename):
+                return 0
+            start = self._align()
+            if start > os.path.getsize(self.filename):
+                self._reset()
+                start = 0
+
+            added = 0
+            with open(self.filename, "rb") as data, \
+                    open(self.idx_path, "ab") as idx, \
+                    open(self.keys_path, "ab") as keys:
+                data.seek(start)
+                offset = start
+                keys_end = keys.tell()
+                for line in data:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                        entry_keys = [record.get(k) for k in KEY_FIELDS]
+                    except ValueError:
+                        entry_keys = None  # corrupt line: keep the slot, skip in scans
+                    key_line = (json.dumps(entry_keys, ensure_ascii=False) + "\n").encode("utf-8")
+                    keys.write(key_line)
+                    keys_end += len(key_line)
+                    idx.write(_ENTRY.pack(offset, len(line), keys_end))
+                    offset += len(line)
+                    added += 1
+            return added
+
+    def __len__(self) -> int:
+        try:
+            return os.path.getsize(self.idx_path) // _ENTRY.size
+        except OSError:
+            return 0
+
+    # --- Reads ---
+
+    def _open_map(self) -> Optional[mmap.mmap]:
+        if not os.path.exists(self.filename) or os.path.getsize(self.filename) == 0:
+            return None
+        with open(self.filename, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, record_id: int) -> Dict[str, Any]:
+        """
+        Returns one record by id.
+
+        Raises:
+            IndexError: If the id is not indexed.
+            ValueError: If the stored line is not valid JSON.
+        """
+        if record_id < 0 or record_id >= len(self):
+            raise IndexError(record_id)
+        with open(self.idx_path, "rb") as idx:
+            idx.seek(record_id * _ENTRY.size)
+            offset, length, _ = _ENTRY.unpack(idx.read(_ENTRY.size))
+        mm = self._open_map()
+        try:
+            return json.loads(mm[offset:offset + length])
+        finally:
+            mm.close()
+
+    def _scan(self, predicate) -> Iterator[Dict[str, Any]]:
+        """Walks both sidecars in lockstep, decoding only records whose keys match."""
+        self.refresh()
+        mm = self._open_map()
+        if mm is None:
+            return
+        try:
+            with open(self.idx_path, "rb") as idx, open(self.keys_path, encoding="utf-8") as keys:
+                for record_id, key_line in enumerate(keys):
+                    raw = idx.read(_ENTRY.size)
+                    if len(raw) < _ENTRY.size:
+                        break
+                    entry_keys = json.loads(key_line)
+                    if entry_keys is None or not predicate(dict(zip(KEY_FIELDS, entry_keys))):
+                        continue
+                    offset, length, _ = _ENTRY.unpack(raw)
+                    record = json.loads(mm[offset:offset + length])
+                    record.setdefault("_id", record_id)
+                    yield record
+        finally:
+            mm.close()
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Yields every valid record in file order."""
+        return self._scan(lambda keys: True)
+
+    def filter(
+        self,
+        cluster_macro: Optional[str] = None,
+        niche: Optional[str] = None,
+        cnpj: Optional[str] = None,
+        since: Optional[Union[str, date, datetime]] = None,
+        until: Optional[Union[str, date, datetime]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields records matching all given key filters, in file order.
+
+        'since' is inclusive and 'until' exclusive, compared against the
+        'YYYY-MM-DD HH:MM:SS' submission timestamp.
+        """
+        since, until = _as_timestamp(since), _as_timestamp(until)
+
+        def predicate(keys: Dict[str, Any]) -> bool:
+            if cluster_macro is not None and keys["cluster_macro"] != cluster_macro:
+                return False
+            if niche is not None and keys["niche"] != niche:
+                return False
+            if cnpj is not None and keys["cnpj"] != cnpj:
+                return False
+            timestamp = keys["timestamp"] or ""
+            if since is not None and timestamp < since:
+                return False
+            if until is not None and timestamp >= until:
+                return False
+            return True
+
+        return self._scan(predicate)
+
+def _as_timestamp(value: Optional[Union[str, date, datetime]]) -> Optional[str]:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+_logs: Dict[str, SubmissionLog] = {}
+_logs_lock = threading.Lock()
+
+def get_submission_log(filename: str = "bmed_submissions.jsonl") -> SubmissionLog:
+    """Returns the shared SubmissionLog for a file, so index updates are serialized per process."""
+    key = os.path.abspath(filename)
+    with _logs_lock:
+        if key not in _logs:
+            _logs[key] = SubmissionLog(filename)
+        return _logs[key]
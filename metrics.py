@@ -0,0 +1,181 @@
+import atexit
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+
+# ==========================================
+# PIPELINE INSTRUMENTATION (PROMETHEUS TEXT FORMAT)
+# ==========================================
+# Environment switches:
+#   BMED_METRICS_FILE     Prometheus text file, rewritten periodically ("" disables)
+#   BMED_METRICS_PORT     If set, serves /metrics on this port
+#   BMED_METRICS_HOST     Interface the endpoint binds to (default 127.0.0.1, local only)
+#   BMED_PROFILE_SAMPLE   Fraction (0..1) of profiled() blocks run under cProfile
+#   BMED_PROFILE_DIR      Where sampled .prof files go
+
+METRICS_FILE = os.environ.get("BMED_METRICS_FILE", "bmed_metrics.prom")
+METRICS_PORT = os.environ.get("BMED_METRICS_PORT")
+METRICS_HOST = os.environ.get("BMED_METRICS_HOST", "127.0.0.1")
+PROFILE_SAMPLE = float(os.environ.get("BMED_PROFILE_SAMPLE", "0") or 0)
+PROFILE_DIR = os.environ.get("BMED_PROFILE_DIR", "profiles")
+EXPORT_INTERVAL = 15.0
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Fixed-bucket latency histogram (seconds)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Thread-safe store for stage histograms, byte counters and gauges."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Histogram] = {}
+        self._bytes: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def add_bytes(self, target: str, count: int) -> None:
+        with self._lock:
+            self._bytes[target] = self._bytes.get(target, 0) + count
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP bmed_stage_duration_seconds Latency of submission pipeline stages.",
+            "# TYPE bmed_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage, hist in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'bmed_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'bmed_stage_duration_seconds_sum{{stage="{stage}"}} {hist.sum}')
+                lines.append(f'bmed_stage_duration_seconds_count{{stage="{stage}"}} {hist.count}')
+
+            lines += [
+                "# HELP bmed_bytes_written_total Bytes written per storage target.",
+                "# TYPE bmed_bytes_written_total counter",
+            ]
+            for target, value in sorted(self._bytes.items()):
+                lines.append(f'bmed_bytes_written_total{{target="{target}"}} {value}')
+
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Atomically rewrites a Prometheus text file (node_exporter textfile style)."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+REGISTRY = MetricsRegistry()
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Records the wall time of the block under the given stage label."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(stage, time.perf_counter() - start)
+
+def add_bytes(target: str, count: int) -> None:
+    REGISTRY.add_bytes(target, count)
+
+def set_gauge(name: str, value: float) -> None:
+    REGISTRY.set_gauge(name, value)
+
+@contextmanager
+def profiled(stage: str) -> Iterator[None]:
+    """Runs a sampled fraction of blocks under cProfile, dumping .prof files."""
+    if PROFILE_SAMPLE <= 0 or random.random() >= PROFILE_SAMPLE:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{stage}_{stamp}_{threading.get_ident()}.prof"))
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+def start_exporters(
+    metrics_file: Optional[str] = METRICS_FILE,
+    port: Optional[str] = METRICS_PORT,
+    host: str = METRICS_HOST,
+) -> None:
+    """Starts the periodic file exporter and the optional HTTP endpoint (once per process)."""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    if metrics_file:
+        def export_loop():
+            while True:
+                time.sleep(EXPORT_INTERVAL)
+                try:
+                    REGISTRY.write(metrics_file)
+                except OSError:
+                    pass
+        threading.Thread(target=export_loop, name="bmed-metrics-file", daemon=True).start()
+        atexit.register(REGISTRY.write, metrics_file)
+
+    if port:
+        server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="bmed-metrics-http", daemon=True).start()
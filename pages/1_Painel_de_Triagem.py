@@ -0,0 +1,198 @@
+"""
+PAINEL DE TRIAGEM b-Med
+-----------------------
+Página de revisores: visão consolidada das submissões com agregados
+por cluster/nicho, busca textual e tabela paginada.
+
+Acesso restrito: a senha dos revisores vem de st.secrets
+("reviewer_password") ou da variável BMED_REVIEWER_PASSWORD. Sem senha
+configurada o painel fica bloqueado.
+"""
+
+import hmac
+import math
+import os
+import streamlit as st
+import pandas as pd
+from typing import Dict
+
+from database import load_submissions_frame, store_version
+from risk import SD_CLUSTER, classify_frame
+from search_index import search_submissions
+from taxonomy import get_taxonomy
+
+st.set_page_config(
+    page_title="Painel de Triagem | b-Med",
+    layout="wide",
+    page_icon="📊"
+)
+
+COMPLIANCE_FLAGS = {"tech_lgpd": "LGPD", "tech_cloud": "Nuvem Segura", "tech_iso": "ISO 27001/SBIS"}
+PAGE_SIZES = [25, 50, 100, 250]
+SEARCH_LIMIT = 50
+
+# --- ACCESS CONTROL (the page ships with the public founders' app) ---
+
+def get_reviewer_password() -> str:
+    """Senha configurada em st.secrets ou no ambiente ('' se nenhuma)."""
+    try:
+        password = st.secrets.get("reviewer_password", "")
+    except Exception:  # no secrets.toml
+        password = ""
+    return password or os.environ.get("BMED_REVIEWER_PASSWORD", "")
+
+def require_reviewer() -> None:
+    """Interrompe a página até o revisor se autenticar."""
+    if st.session_state.get("reviewer_authenticated"):
+        return
+    expected = get_reviewer_password()
+    st.title("📊 Painel de Triagem")
+    if not expected:
+        st.error("Painel desabilitado: configure 'reviewer_password' em st.secrets ou BMED_REVIEWER_PASSWORD.")
+        st.stop()
+    with st.form("reviewer_login"):
+        password = st.text_input("Senha de revisor", type="password")
+        submitted = st.form_submit_button("Entrar")
+    if submitted:
+        if hmac.compare_digest(password.encode("utf-8"), expected.encode("utf-8")):
+            st.session_state.reviewer_authenticated = True
+            st.rerun()
+        st.error("Senha incorreta.")
+    st.stop()
+
+# --- CACHED DATA (shared by every reviewer session in this process) ---
+
+@st.cache_resource(max_entries=1, show_spinner="Carregando submissões...")
+def get_submissions(version: int) -> pd.DataFrame:
+    """DataFrame do banco, recarregado apenas quando 'version' muda. Tratar como somente leitura."""
+    return load_submissions_frame()
+
+@st.cache_resource(max_entries=1)
+def get_aggregates(version: int) -> Dict[str, pd.DataFrame]:
+    """Agregados vetorizados sobre todo o banco, calculados uma vez por versão."""
+    df = get_submissions(version)
+    if df.empty:
+        return {}
+    flags = list(COMPLIANCE_FLAGS)
+    sd_rows = df[df["cluster_macro"] == SD_CLUSTER]
+    risk = classify_frame(sd_rows)
+    return {
+        "risk": pd.crosstab(
+            risk["implied_category"].rename("Categoria IMDRF"),
+            risk["consistency"].rename("Classe declarada"),
+        ),
+        "by_niche": (
+            df.groupby(["cluster_macro", "niche"], dropna=False).size()
+            .rename("submissoes").reset_index()
+            .sort_values("submissoes", ascending=False)
+        ),
+        "by_anvisa": (
+            df.groupby(["cluster_macro", "tech_anvisa_status"], dropna=False).size()
+            .unstack(fill_value=0)
+        ),
+        "compliance": (
+            df.groupby("cluster_macro", dropna=False)[flags].mean()
+            .rename(columns=COMPLIANCE_FLAGS)
+            .mul(100).round(1)
+        ),
+    }
+
+def apply_filters(df: pd.DataFrame, clusters, niches, anvisa) -> pd.DataFrame:
+    """Filtra com máscaras booleanas (sem iterar linhas)."""
+    mask = pd.Series(True, index=df.index)
+    if clusters:
+        mask &= df["cluster_macro"].isin(clusters)
+    if niches:
+        mask &= df["niche"].isin(niches)
+    if anvisa:
+        mask &= df["tech_anvisa_status"].isin(anvisa)
+    return df[mask]
+
+def render_overview(df: pd.DataFrame, aggregates: Dict[str, pd.DataFrame]) -> None:
+    """Renderiza métricas e agregados gerais."""
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Submissões", len(df))
+    col2.metric("Startups (e-mails únicos)", df["email"].nunique())
+    col3.metric("Com registro ANVISA", int((df["tech_anvisa_status"] == "Aprovado (Com Registro)").sum()))
+
+    tab_niche, tab_anvisa, tab_comp, tab_risk = st.tabs(
+        ["Cluster / Nicho", "Status ANVISA", "Conformidade (%)", "Risco SaMD"]
+    )
+    with tab_niche:
+        st.dataframe(aggregates["by_niche"], hide_index=True, width="stretch")
+    with tab_anvisa:
+        st.dataframe(aggregates["by_anvisa"], width="stretch")
+    with tab_comp:
+        st.dataframe(aggregates["compliance"], width="stretch")
+    with tab_risk:
+        st.caption("Categoria implícita pela matriz IMDRF (0 = dados incompletos) x classe autodeclarada.")
+        st.dataframe(aggregates["risk"], width="stretch")
+
+def render_search(df: pd.DataFrame) -> None:
+    """Busca textual ranqueada em descrições, engajamento, monetização e PDFs anexados."""
+    st.subheader("🔎 Busca textual")
+    query = st.text_input(
+        "Buscar", placeholder="ex.: monitoramento remoto de pacientes diabéticos",
+        help="Ignora acentos e variações (diagnóstico / diagnósticos). Todas as palavras precisam aparecer.",
+    )
+    col_s1, col_s2 = st.columns(2)
+    with col_s1:
+        clusters = st.multiselect("Cluster", list(get_taxonomy().clusters), key="search_clusters")
+    with col_s2:
+        niches = st.multiselect("Nicho", sorted(df["niche"].dropna().unique()), key="search_niches")
+    if not query.strip():
+        return
+
+    hits = search_submissions(query, clusters=clusters, niches=niches, limit=SEARCH_LIMIT)
+    if not hits:
+        st.info("Nenhuma submissão encontrada.")
+        return
+    st.dataframe(
+        pd.DataFrame([{
+            "Startup": hit.startup_name, "Produto": hit.product_name, "Cluster": hit.cluster_macro,
+            "Nicho": hit.niche, "Relevância": hit.score, "Trecho": hit.excerpt,
+        } for hit in hits]),
+        hide_index=True, width="stretch",
+    )
+    st.caption(f"{len(hits)} melhores resultados.")
+
+def render_table(df: pd.DataFrame) -> None:
+    """Renderiza a tabela paginada no servidor: só a página atual é enviada ao navegador."""
+    st.subheader("Submissões")
+    col_f1, col_f2, col_f3 = st.columns(3)
+    with col_f1:
+        clusters = st.multiselect("Cluster", list(get_taxonomy().clusters))
+    with col_f2:
+        niches = st.multiselect("Nicho", sorted(df["niche"].dropna().unique()))
+    with col_f3:
+        anvisa = st.multiselect("Status ANVISA", sorted(df["tech_anvisa_status"].dropna().unique()))
+
+    filtered = apply_filters(df, clusters, niches, anvisa)
+
+    col_p1, col_p2 = st.columns([1, 3])
+    with col_p1:
+        page_size = st.selectbox("Linhas por página", PAGE_SIZES)
+    total_pages = max(1, math.ceil(len(filtered) / page_size))
+    with col_p2:
+        page = st.number_input(f"Página (de {total_pages})", min_value=1, max_value=total_pages, value=1)
+
+    start = (page - 1) * page_size
+    st.dataframe(filtered.iloc[start:start + page_size], hide_index=True, width="stretch")
+    st.caption(f"{len(filtered)} submissões após filtros.")
+
+def main() -> None:
+    """Função Principal."""
+    require_reviewer()
+    st.title("📊 Painel de Triagem")
+    version = store_version()
+    df = get_submissions(version)
+    if df.empty:
+        st.info("Nenhuma submissão registrada ainda.")
+        return
+    render_overview(df, get_aggregates(version))
+    st.markdown("---")
+    render_search(df)
+    st.markdown("---")
+    render_table(df)
+
+main()
@@ -0,0 +1,391 @@
+"""
+INGESTÃO DE PDFs b-Med
+----------------------
+Background extraction of text, page count and metadata from submission
+attachments, kept off the request path.
+
+handle_final_submission only enqueues one job per submission in the
+ingest_jobs table. A dispatcher thread claims due jobs under a lease and
+runs them on a small process pool with lowered priority. Results are
+written to <folder>/ingest.json. A crashed or killed worker leaves its
+job leased; the lease expires and the job is picked up again. Failures
+are retried with exponential backoff up to a maximum number of attempts.
+
+Usage:
+    python pdf_ingest.py run --workers 2
+    python pdf_ingest.py status
+    python pdf_ingest.py backfill
+    python pdf_ingest.py retry-failed
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from database import DEFAULT_DB, get_connection
+from blob_store import MANIFEST_NAME, load_manifest
+from metrics import set_gauge, timed
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Environment switches:
+#   BMED_INGEST_WORKERS       Extraction processes (default 1)
+#   BMED_INGEST_NICE          Niceness added to extraction processes (default 10)
+#   BMED_INGEST_INPROCESS     "0" keeps the app from starting its own dispatcher
+#   BMED_INGEST_MAX_ATTEMPTS  Attempts before a job is marked failed (default 5)
+
+INGEST_WORKERS = int(os.environ.get("BMED_INGEST_WORKERS", "1"))
+INGEST_NICE = int(os.environ.get("BMED_INGEST_NICE", "10"))
+INGEST_INPROCESS = os.environ.get("BMED_INGEST_INPROCESS", "1") != "0"
+MAX_ATTEMPTS = int(os.environ.get("BMED_INGEST_MAX_ATTEMPTS", "5"))
+
+BACKOFF_BASE = 30.0       # seconds before the first retry, doubled per attempt
+BACKOFF_MAX = 3600.0
+LEASE_SECONDS = 600.0     # a running job older than this is considered abandoned
+POLL_INTERVAL = 5.0
+MAX_TEXT_CHARS = 1_000_000  # per attachment, keeps sidecars bounded
+SIDECAR_NAME = "ingest.json"
+INGESTED_EXTENSIONS = (".pdf",)
+
+_JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    folder_path TEXT NOT NULL UNIQUE,
+    files TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    claimed_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_due ON ingest_jobs (status, next_attempt_at);
+"""
+
+def _connection(db_path: str):
+    conn = get_connection(db_path)
+    conn.executescript(_JOBS_SCHEMA)
+    return conn
+
+# ==========================================
+# JOB QUEUE (SQLITE)
+# ==========================================
+
+def enqueue_submission(folder_path: str, file_paths: List[str], db_path: str = DEFAULT_DB) -> bool:
+    """
+    Queues the PDF attachments of a submission for extraction.
+
+    Args:
+        folder_path (str): The submission folder (Submissoes/<name>_<timestamp>).
+        file_paths (List[str]): Saved attachment paths; non-PDF files are ignored.
+        db_path (str): SQLite database path.
+
+    Returns:
+        bool: True if a job was queued (False when there is nothing to ingest
+        or the folder is already queued).
+    """
+    files = sorted(
+        os.path.basename(path) for path in file_paths
+        if path and path.lower().endswith(INGESTED_EXTENSIONS)
+    )
+    if not files:
+        return False
+    conn = _connection(db_path)
+    with conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO ingest_jobs (folder_path, files) VALUES (?, ?)",
+            (folder_path, json.dumps(files, ensure_ascii=False)),
+        )
+    return cursor.rowcount > 0
+
+def claim_jobs(worker_id: str, limit: int, db_path: str = DEFAULT_DB) -> List[Dict[str, Any]]:
+    """
+    Atomically leases up to 'limit' due jobs (pending, or running with an expired lease).
+
+    Claiming counts as an attempt, so a PDF that kills its worker every
+    time still ends up failed instead of looping forever.
+    """
+    now = time.time()
+    conn = _connection(db_path)
+    with conn:
+        rows = conn.execute(
+            """
+            UPDATE ingest_jobs
+            SET status = 'running', claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM ingest_jobs
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'running' AND claimed_at < ?)
+                ORDER BY id LIMIT ?
+            )
+            RETURNING id, folder_path, files, attempts
+            """,
+            (worker_id, now, now, now - LEASE_SECONDS, limit),
+        ).fetchall()
+    return [
+        {"id": row["id"], "folder_path": row["folder_path"], "files": json.loads(row["files"]), "attempts": row["attempts"]}
+        for row in rows
+    ]
+
+def complete_job(job_id: int, db_path: str = DEFAULT_DB) -> None:
+    conn = _connection(db_path)
+    with conn:
+        conn.execute(
+            "UPDATE ingest_jobs SET status = 'done', claimed_by = NULL, last_error = NULL WHERE id = ?",
+            (job_id,),
+        )
+
+def fail_job(job_id: int, attempts: int, error: str, db_path: str = DEFAULT_DB) -> None:
+    """Schedules a retry with exponential backoff, or marks the job failed."""
+    conn = _connection(db_path)
+    with conn:
+        if attempts >= MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE ingest_jobs SET status = 'failed', claimed_by = NULL, last_error = ? WHERE id = ?",
+                (error, job_id),
+            )
+        else:
+            delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+            conn.execute(
+                "UPDATE ingest_jobs SET status = 'pending', claimed_by = NULL, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, job_id),
+            )
+
+def job_counts(db_path: str = DEFAULT_DB) -> Dict[str, int]:
+    """Number of jobs per status."""
+    conn = _connection(db_path)
+    return {row["status"]: row["n"] for row in conn.execute("SELECT status, COUNT(*) AS n FROM ingest_jobs GROUP BY status")}
+
+def retry_failed(db_path: str = DEFAULT_DB) -> int:
+    """Puts failed jobs back in the queue with a fresh attempt budget."""
+    conn = _connection(db_path)
+    with conn:
+        cursor = conn.execute(
+            "UPDATE ingest_jobs SET status = 'pending', attempts = 0, next_attempt_at = 0 WHERE status = 'failed'"
+        )
+    return cursor.rowcount
+
+def backfill(root: str = "Submissoes", db_path: str = DEFAULT_DB) -> int:
+    """Queues every existing submission folder that has PDFs listed in its manifest."""
+    queued = 0
+    if not os.path.isdir(root):
+        return 0
+    for name in sorted(os.listdir(root)):
+        folder_path = os.path.join(root, name)
+        if name.startswith("_") or not os.path.exists(os.path.join(folder_path, MANIFEST_NAME)):
+            continue
+        files = list(load_manifest(folder_path))
+        queued += enqueue_submission(folder_path, [os.path.join(folder_path, n) for n in files], db_path)
+    return queued
+
+# ==========================================
+# EXTRACTION (RUNS IN WORKER PROCESSES)
+# ==========================================
+
+def _lower_priority() -> None:
+    """Pool initializer: yield the CPU to the interactive Streamlit threads."""
+    if INGEST_NICE and hasattr(os, "nice"):
+        try:
+            os.nice(INGEST_NICE)
+        except OSError:
+            pass
+
+def extract_pdf(path: str, max_chars: int = MAX_TEXT_CHARS) -> Dict[str, Any]:
+    """
+    Extracts page count, document metadata and text from one PDF.
+
+    Raises:
+        FileNotFoundError: If the attachment is gone.
+        Exception: Any pypdf error for unreadable files.
+    """
+    from pypdf import PdfReader  # imported here so the app starts without it
+
+    reader = PdfReader(path)
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise ValueError("PDF protegido por senha")
+
+    metadata = {
+        key.lstrip("/"): str(value)
+        for key, value in (reader.metadata or {}).items()
+        if value is not None
+    }
+    parts, chars, truncated = [], 0, False
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if chars + len(text) > max_chars:
+            parts.append(text[:max_chars - chars])
+            truncated = True
+            break
+        parts.append(text)
+        chars += len(text)
+    text = "\n".join(parts)
+    return {
+        "pages": len(reader.pages),
+        "metadata": metadata,
+        "text": text,
+        "text_chars": len(text),
+        "truncated": truncated,
+    }
+
+def ingest_submission(folder_path: str, files: List[str]) -> Dict[str, Any]:
+    """
+    Extracts every listed attachment of a submission.
+
+    A file that cannot be parsed gets an 'error' entry instead of failing
+    the job: retrying would not fix a corrupt PDF. Only a missing file
+    raises, since the folder may still be syncing.
+    """
+    results = {}
+    for name in files:
+        path = os.path.join(folder_path, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        try:
+            results[name] = extract_pdf(path)
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+        results[name]["size"] = os.path.getsize(path)
+    return {
+        "ingested_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "files": results,
+    }
+
+def write_sidecar(folder_path: str, result: Dict[str, Any]) -> str:
+    """Writes <folder>/ingest.json atomically and returns its path."""
+    path = os.path.join(folder_path, SIDECAR_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+def load_sidecar(folder_path: str) -> Optional[Dict[str, Any]]:
+    """Returns a submission's extraction results, or None if not ingested yet."""
+    path = os.path.join(folder_path, SIDECAR_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# ==========================================
+# DISPATCHER
+# ==========================================
+
+class IngestWorker:
+    """
+    Claims due jobs and runs them on a process pool of at most 'workers' processes.
+
+    Several dispatchers (app replicas, the CLI) may share one database:
+    claims are atomic and leased, so each job runs once at a time.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB, workers: int = INGEST_WORKERS, poll_interval: float = POLL_INTERVAL):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs Streamlit's threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+            )
+        return self._pool
+
+    def run_once(self) -> int:
+        """Runs one round of up to 'workers' jobs; returns how many were claimed."""
+        from search_index import index_attachments  # search_index reads our sidecars
+
+        jobs = claim_jobs(self.worker_id, self.workers, self.db_path)
+        if not jobs:
+            return 0
+        pool = self._get_pool()
+        futures = [(job, pool.submit(ingest_submission, job["folder_path"], job["files"])) for job in jobs]
+        for job, future in futures:
+            try:
+                with timed("pdf_ingest"):
+                    result = future.result()
+                write_sidecar(job["folder_path"], result)
+                index_attachments(job["folder_path"], self.db_path)
+            except FileNotFoundError as e:
+                fail_job(job["id"], job["attempts"], f"Arquivo ausente: {e}", db_path=self.db_path)
+            except BrokenProcessPool as e:
+                self._pool = None  # a worker died (e.g. OOM on a huge PDF); start a fresh pool
+                fail_job(job["id"], job["attempts"], f"Worker encerrado: {e}", db_path=self.db_path)
+            except Exception as e:
+                fail_job(job["id"], job["attempts"], f"{type(e).__name__}: {e}", db_path=self.db_path)
+            else:
+                complete_job(job["id"], self.db_path)
+        set_gauge("bmed_ingest_pending", job_counts(self.db_path).get("pending", 0))
+        return len(jobs)
+
+    def run_forever(self, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                claimed = 0  # database busy or similar; try again next poll
+            if not claimed:
+                stop.wait(self.poll_interval)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+_worker_started = False
+_worker_lock = threading.Lock()
+
+def start_ingest_worker(db_path: str = DEFAULT_DB) -> None:
+    """Starts the in-app dispatcher thread once per process (unless BMED_INGEST_INPROCESS=0)."""
+    global _worker_started
+    if not INGEST_INPROCESS:
+        return
+    with _worker_lock:
+        if _worker_started:
+            return
+        _worker_started = True
+    worker = IngestWorker(db_path)
+    threading.Thread(target=worker.run_forever, name="bmed-ingest", daemon=True).start()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "status", "backfill", "retry-failed"])
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--once", action="store_true", help="'run': stop when the queue is empty.")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(json.dumps(job_counts(args.db), indent=2))
+    elif args.command == "backfill":
+        print(f"{backfill(db_path=args.db)} submissões enfileiradas.")
+    elif args.command == "retry-failed":
+        print(f"{retry_failed(args.db)} jobs reenfileirados.")
+    else:
+        worker = IngestWorker(args.db, workers=args.workers)
+        try:
+            if args.once:
+                while worker.run_once():
+                    pass
+            else:
+                worker.run_forever()
+        finally:
+            worker.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import atexit
+import copy
+import logging
+import queue
+import threading
+import uuid
+from concurrent.futures import Future, InvalidStateError
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import append_to_jsonl
+from database import DEFAULT_DB, insert_submissions
+from excel_export import get_workbook_rebuilder
+from jsonl_index import get_submission_log
+from dedup import index_submissions
+from search_index import index_submissions as index_search
+from metrics import set_gauge
+from submission_log import SHARD_DIR, ShardWriter, canonical_path, start_compactor
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# WRITE-BEHIND PERSISTENCE SERVICE
+# ==========================================
+
+@dataclass
+class SubmissionTicket:
+    """Per-submission acknowledgements, resolved by the writer thread."""
+    database: Future = field(default_factory=Future)
+    jsonl: Future = field(default_factory=Future)
+    excel: Future = field(default_factory=Future)
+
+_STOP = object()
+
+class PersistenceService:
+    """
+    Process-wide single writer for the SQLite store and the JSONL backup;
+    the Excel database is rebuilt from the JSONL in the background.
+
+    Streamlit sessions only enqueue payloads; one daemon thread drains the
+    queue in batches. The workbook is never opened on the submit path:
+    its acknowledgement resolves when the next background rebuild, shared
+    by every submission that arrived meanwhile, has replaced the file.
+
+    With a shard_dir (BMED_SHARD_DIR), several replicas can run side by
+    side: each one only appends to its own shard file and a background
+    compactor folds the shards into the canonical stores.
+    """
+
+    def __init__(
+        self,
+        jsonl_filename: str = "bmed_submissions.jsonl",
+        excel_filename: str = "bmed_startups_database.xlsx",
+        db_filename: str = DEFAULT_DB,
+        max_queue: int = 256,
+        max_batch: int = 50,
+        shard_dir: str = SHARD_DIR,
+    ):
+        if shard_dir:
+            # Sharded replicas share one canonical JSONL/workbook (the database via DEFAULT_DB)
+            jsonl_filename = canonical_path(jsonl_filename, shard_dir)
+            excel_filename = canonical_path(excel_filename, shard_dir)
+        self.jsonl_filename = jsonl_filename
+        self.excel_filename = excel_filename
+        self.db_filename = db_filename
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._rebuilder = get_workbook_rebuilder(excel_filename, jsonl_filename)
+        self._shard = ShardWriter(shard_dir) if shard_dir else None
+        if self._shard is not None:
+            start_compactor(
+                shard_dir=shard_dir, db_path=db_filename,
+                jsonl_filename=jsonl_filename, excel_filename=excel_filename,
+            )
+        self._thread = threading.Thread(target=self._run, name="bmed-persistence", daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    def submit(self, data: Dict[str, Any], timeout: Optional[float] = 10.0) -> SubmissionTicket:
+        """
+        Enqueues a submission payload for persistence.
+
+        Args:
+            data (Dict): The final_data payload. A deep copy is queued,
+                stamped with a unique submission_id if it has none.
+            timeout (float): Seconds to wait for room in the queue.
+
+        Returns:
+            SubmissionTicket: Futures resolved once each store is written.
+
+        Raises:
+            queue.Full: If the queue stays full for the whole timeout.
+            RuntimeError: If the service has been shut down.
+        """
+        if self._closed:
+            raise RuntimeError("Serviço de persistência encerrado.")
+        ticket = SubmissionTicket()
+        payload = copy.deepcopy(data)
+        payload.setdefault("submission_id", uuid.uuid4().hex)
+        self._queue.put((payload, ticket), timeout=timeout)
+        set_gauge("bmed_persistence_queue_depth", self._queue.qsize())
+        return ticket
+
+    @property
+    def queue_depth(self) -> int:
+        """Approximate number of submissions waiting to be written."""
+        return self._queue.qsize()
+
+    def flush(self) -> None:
+        """Blocks until every queued submission has been processed, workbook included."""
+        self._queue.join()
+        self._rebuilder.flush()
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Flushes pending submissions, stops the writer thread and brings the workbook up to date."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._rebuilder.flush(timeout)
+
+    def _next_batch(self) -> Tuple[List[Tuple[Dict[str, Any], SubmissionTicket]], bool]:
+        """Blocks for one item, then drains whatever else is already queued."""
+        batch, stop = [], False
+        item = self._queue.get()
+        while True:
+            if item is _STOP:
+                stop = True
+            else:
+                batch.append(item)
+            if stop or len(batch) >= self.max_batch:
+                break
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+        return batch, stop
+
+    def _run(self) -> None:
+        """Writer loop: SQLite (system of record), JSONL backup, then a background workbook rebuild."""
+        while True:
+            batch, stop = self._next_batch()
+            set_gauge("bmed_persistence_queue_depth", self._queue.qsize())
+            set_gauge("bmed_persistence_last_batch_size", len(batch))
+            try:
+                if batch:
+                    self._write_batch(batch)
+            except Exception as e:
+                # Never let one bad batch kill the writer: fail its pending acks and keep draining
+                logger.exception("Falha ao persistir um lote de %d submissões", len(batch))
+                self._fail_pending(batch, e)
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[Tuple[Dict[str, Any], SubmissionTicket]]) -> None:
+        records = [data for data, _ in batch]
+        if self._shard is not None:
+            self._write_shard(batch, records)
+            return
+        for name, write, filename in (
+            ("database", insert_submissions, self.db_filename),
+            ("jsonl", append_to_jsonl, self.jsonl_filename),
+        ):
+            try:
+                written = write(records, filename)
+            except Exception as e:
+                for _, ticket in batch:
+                    getattr(ticket, name).set_exception(e)
+                    if name == "jsonl":
+                        ticket.excel.set_exception(e)  # the workbook is built from the JSONL
+            else:
+                for _, ticket in batch:
+                    getattr(ticket, name).set_result(True)
+                if name == "database":
+                    self._index_duplicates(written, records)
+                    self._index_search(written, records)
+                elif name == "jsonl":
+                    self._refresh_jsonl_index()
+                    self._schedule_workbook(batch)
+
+    @staticmethod
+    def _fail_pending(batch: List[Tuple[Dict[str, Any], SubmissionTicket]], error: BaseException) -> None:
+        """Resolves every acknowledgement of the batch that is still open with the error."""
+        for _, ticket in batch:
+            for future in (ticket.database, ticket.jsonl, ticket.excel):
+                if not future.done():
+                    try:
+                        future.set_exception(error)
+                    except InvalidStateError:
+                        pass  # resolved concurrently by a workbook rebuild
+
+    def _write_shard(self, batch: List[Tuple[Dict[str, Any], SubmissionTicket]], records: List[Dict[str, Any]]) -> None:
+        """Sharded mode: the shard append is the acknowledgement for every store."""
+        try:
+            self._shard.append(records)
+        except Exception as e:
+            for _, ticket in batch:
+                for future in (ticket.database, ticket.jsonl, ticket.excel):
+                    future.set_exception(e)
+        else:
+            for _, ticket in batch:
+                for future in (ticket.database, ticket.jsonl, ticket.excel):
+                    future.set_result(True)
+
+    def _schedule_workbook(self, batch: List[Tuple[Dict[str, Any], SubmissionTicket]]) -> None:
+        """Resolves the batch's Excel acks when the next background rebuild finishes."""
+        def propagate(rebuild: Future) -> None:
+            error = rebuild.exception()
+            for _, ticket in batch:
+                if error is None:
+                    ticket.excel.set_result(True)
+                else:
+                    ticket.excel.set_exception(error)
+        self._rebuilder.request().add_done_callback(propagate)
+
+    def _index_duplicates(self, ids: List[Optional[int]], records: List[Dict[str, Any]]) -> None:
+        """Keeps the duplicate index current; its refresh() pulls whatever was missed from the store."""
+        try:
+            index_submissions(ids, records)
+        except Exception:
+            pass
+
+    def _index_search(self, ids: List[Optional[int]], records: List[Dict[str, Any]]) -> None:
+        """Keeps the full-text index current; search_submissions() catches up on failure."""
+        try:
+            index_search(ids, records, self.db_filename)
+        except Exception:
+            pass
+
+    def _refresh_jsonl_index(self) -> None:
+        """Keeps the JSONL offset index current; readers refresh too, so failures are not fatal."""
+        try:
+            get_submission_log(self.jsonl_filename).refresh()
+        except Exception:
+            pass
+
+_service: Optional[PersistenceService] = None
+_service_lock = threading.Lock()
+
+def get_persistence_service() -> PersistenceService:
+    """Returns the process-wide persistence service, starting it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = PersistenceService()
+            atexit.register(_service.shutdown)
+        return _service
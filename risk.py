@@ -0,0 +1,126 @@
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+
+from database import DEFAULT_DB, get_connection
+from settings import SD_INTENDED_USE_OPTIONS, SD_CRITICALITY_OPTIONS, SAMD_CLASS_OPTIONS
+
+# ==========================================
+# SaMD RISK CLASSIFICATION (SUPORTE À DIAGNÓSTICO)
+# ==========================================
+
+SD_CLUSTER = "Suporte à Diagnóstico e Conduta"
+
+# IMDRF SaMD category (I..IV as 1..4) indexed by
+# [significance (treat/diagnose, drive, inform)][situation (critical, serious, non-serious)]
+SAMD_MATRIX = np.array([
+    [4, 3, 2],
+    [3, 2, 1],
+    [2, 1, 1],
+], dtype=np.int8)
+
+CONSISTENCY_LABELS = ["incompleta", "consistente", "subdeclarada", "superdeclarada"]
+
+# Changes whenever the matrix or option lists change, marking stored scores stale
+RULES_VERSION = hashlib.sha256(json.dumps([
+    SAMD_MATRIX.tolist(), SD_INTENDED_USE_OPTIONS, SD_CRITICALITY_OPTIONS, SAMD_CLASS_OPTIONS
+], ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+_SCORES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS risk_scores (
+    submission_id INTEGER PRIMARY KEY REFERENCES submissions(id),
+    rules_version TEXT NOT NULL,
+    implied_category INTEGER,
+    declared_class INTEGER,
+    consistency TEXT NOT NULL
+);
+"""
+
+def classify_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Scores Suporte à Diagnóstico rows in one vectorized pass.
+
+    Args:
+        df (pd.DataFrame): Reads the 'sd_intended_use', 'sd_criticality'
+            and 'samd_class' columns (form option strings); missing columns
+            count as unanswered.
+
+    Returns:
+        pd.DataFrame: Same index, with 'implied_category' and 'declared_class'
+        (1..4, 0 when unknown) and a categorical 'consistency' column.
+    """
+    # json_normalize omits the sd_* columns when no Suporte à Diagnóstico row exists
+    answers = df.reindex(columns=["sd_intended_use", "sd_criticality", "samd_class"])
+    use = pd.Categorical(answers["sd_intended_use"], categories=SD_INTENDED_USE_OPTIONS).codes
+    crit = pd.Categorical(answers["sd_criticality"], categories=SD_CRITICALITY_OPTIONS).codes
+    declared = pd.Categorical(answers["samd_class"], categories=SAMD_CLASS_OPTIONS).codes.astype(np.int8) + 1
+
+    known = (use >= 0) & (crit >= 0)
+    implied = np.where(known, SAMD_MATRIX[use.clip(0), crit.clip(0)], 0).astype(np.int8)
+
+    consistency = np.select(
+        [~known | (declared == 0), declared == implied, declared < implied],
+        [0, 1, 2],
+        default=3,
+    )
+    return pd.DataFrame({
+        "implied_category": implied,
+        "declared_class": declared,
+        "consistency": pd.Categorical.from_codes(consistency, CONSISTENCY_LABELS),
+    }, index=df.index)
+
+def score_store(db_path: str = DEFAULT_DB, force: bool = False) -> int:
+    """
+    Scores stored Suporte à Diagnóstico submissions into the risk_scores table.
+
+    Only rows without a score, or scored under an older RULES_VERSION, are
+    read and rewritten, so re-running after each save is cheap.
+
+    Args:
+        db_path (str): SQLite database path.
+        force (bool): Re-score every row regardless of version.
+
+    Returns:
+        int: Number of rows (re)scored.
+    """
+    conn = get_connection(db_path)
+    conn.executescript(_SCORES_SCHEMA)
+    sql = """
+        SELECT s.id,
+               json_extract(s.specific_data, '$.sd_intended_use') AS sd_intended_use,
+               json_extract(s.specific_data, '$.sd_criticality') AS sd_criticality,
+               json_extract(s.specific_data, '$.samd_class') AS samd_class
+        FROM submissions s
+        LEFT JOIN risk_scores r ON r.submission_id = s.id
+        WHERE s.cluster_macro = ?
+    """
+    params = [SD_CLUSTER]
+    if not force:
+        sql += " AND (r.submission_id IS NULL OR r.rules_version != ?)"
+        params.append(RULES_VERSION)
+
+    pending = pd.read_sql_query(sql, conn, params=params, index_col="id")
+    if pending.empty:
+        return 0
+
+    scores = classify_frame(pending)
+    rows = zip(
+        scores.index.tolist(),
+        [RULES_VERSION] * len(scores),
+        scores["implied_category"].tolist(),
+        scores["declared_class"].tolist(),
+        scores["consistency"].astype(str).tolist(),
+    )
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO risk_scores VALUES (?, ?, ?, ?, ?)", rows)
+    return len(scores)
+
+def load_risk_scores(db_path: str = DEFAULT_DB) -> pd.DataFrame:
+    """Returns the stored scores indexed by submission id."""
+    conn = get_connection(db_path)
+    conn.executescript(_SCORES_SCHEMA)
+    return pd.read_sql_query("SELECT * FROM risk_scores", conn, index_col="submission_id")
+
+if __name__ == "__main__":
+    print(f"{score_store()} submissões pontuadas (regras {RULES_VERSION}).")
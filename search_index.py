@@ -0,0 +1,303 @@
+import hashlib
+import json
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from database import DEFAULT_DB, get_connection
+from pdf_ingest import load_sidecar
+
+# ==========================================
+# PORTUGUESE TEXT NORMALIZATION
+# ==========================================
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Already accent-folded, since folding happens before the lookup
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de dela dele deles demais depois do dos e ela elas ele eles em entre era
+essa esse esta este eu foi for ha isso isto ja la mais mas me mesmo meu minha muito na nao nas nem no nos
+nossa nosso num numa o os ou para pela pelas pelo pelos por qual quando que quem se sem ser seu sua so sobre
+tambem te tem ter um uma umas uns vai voce
+""".split())
+
+# Plural endings -> singular, checked in order (RSLP plural step, simplified)
+_PLURAL_RULES = (
+    ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"),
+    ("res", "r"), ("zes", "z"), ("les", "l"), ("ns", "m"),
+)
+# Verb and derivational suffixes, longest first; removed only if a stem of 4+ letters remains
+_SUFFIXES = tuple(sorted((
+    "amento", "imento", "mente", "izacao", "acao", "icao", "ucao", "encia", "ancia",
+    "idade", "ismo", "ista", "ador", "edor", "idor", "ante", "avel", "ivel",
+    "ando", "endo", "indo", "ado", "ido", "ico", "ica", "ivo", "iva", "oso", "osa",
+    "ar", "er", "ir",
+), key=len, reverse=True))
+_MIN_STEM = 4
+
+def fold_accents(text: str) -> str:
+    """Lowercases and strips diacritics (saúde -> saude, ação -> acao)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+@lru_cache(maxsize=65536)  # vocabularies are small next to token counts
+def stem(token: str) -> str:
+    """
+    Light Portuguese stemmer: plural, one verb/derivational suffix, final vowel.
+
+    Conservative by design: it only has to map inflections of the same word
+    to one key (diagnóstico, diagnósticos, diagnóstica -> diagnost), not to
+    produce linguistic roots.
+    """
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith("s") and not token.endswith(("ss", "us")):
+        for suffix, replacement in _PLURAL_RULES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+                token = token[:-len(suffix)] + replacement
+                break
+        else:
+            token = token[:-1]
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            token = token[:-len(suffix)]
+            break
+    if len(token) > _MIN_STEM and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+def normalize(text: Optional[str]) -> List[str]:
+    """Folds, tokenizes, drops stopwords and stems free text."""
+    if not text:
+        return []
+    return [stem(t) for t in _TOKEN_RE.findall(fold_accents(text)) if t not in STOPWORDS]
+
+# ==========================================
+# FTS5 INDEX (SAME SQLITE STORE)
+# ==========================================
+
+# Each column holds the normalized terms of one source; rowid = submissions.id.
+# 'facets' holds one token per cluster/niche so filters are doclist
+# intersections inside FTS5 instead of a join over every match.
+_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS submission_search USING fts5(
+    description, engagement, monetization, attachments, facets,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_folder_path ON submissions (folder_path);
+"""
+# bm25 weights per column: the description says the most about the product
+_WEIGHTS = (3.0, 1.5, 1.5, 1.0, 0.0)
+# bm25 costs ~1.5 us per matching row (it reads each row's length), so
+# queries matching more rows than this rank only the most recent ones
+RANK_WINDOW = 5000
+SYNC_BATCH = 2000
+
+@dataclass
+class SearchHit:
+    """One ranked search result."""
+    id: int
+    startup_name: str
+    product_name: str
+    cluster_macro: str
+    niche: str
+    score: float
+    excerpt: str
+
+def _connection(db_path: str):
+    conn = get_connection(db_path)
+    conn.executescript(_SEARCH_SCHEMA)
+    return conn
+
+def _attachments_text(folder_path: Optional[str]) -> str:
+    """Text extracted by pdf_ingest for a submission folder ('' if not ingested yet)."""
+    sidecar = load_sidecar(folder_path) if folder_path else None
+    if sidecar is None:
+        return ""
+    return "\n".join(entry.get("text", "") for entry in sidecar.get("files", {}).values())
+
+def facet_token(kind: str, value: Optional[str]) -> str:
+    """A single alphanumeric FTS token standing for a cluster ('c') or niche ('n') value."""
+    return kind + hashlib.sha1((value or "").encode("utf-8")).hexdigest()[:12]
+
+def _document(data: Dict[str, Any], attachments: str = "") -> tuple:
+    specific = data.get("specific_data") or {}
+    return (
+        " ".join(normalize(data.get("description"))),
+        " ".join(normalize(specific.get("engagement_process"))),
+        " ".join(normalize(specific.get("monetization_process"))),
+        " ".join(normalize(attachments)),
+        f"{facet_token('c', data.get('cluster_macro'))} {facet_token('n', data.get('niche'))}",
+    )
+
+def index_submissions(ids: List[Optional[int]], records: List[Dict[str, Any]], db_path: str = DEFAULT_DB) -> None:
+    """
+    Indexes freshly saved submissions (called by the persistence writer).
+
+    Attachment text usually arrives later, through index_attachments().
+    """
+    rows = [
+        (submission_id, *_document(data, _attachments_text(data.get("folder_path"))))
+        for submission_id, data in zip(ids, records) if submission_id is not None
+    ]
+    if not rows:
+        return
+    conn = _connection(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO submission_search "
+            "(rowid, description, engagement, monetization, attachments, facets) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+def index_attachments(folder_path: str, db_path: str = DEFAULT_DB) -> bool:
+    """
+    Refreshes the attachment text of the submission stored in 'folder_path'.
+
+    Returns:
+        bool: False if the submission is not in the index yet (sync_index
+        will pick the text up when it gets there).
+    """
+    conn = _connection(db_path)
+    row = conn.execute(
+        "SELECT s.id FROM submissions s JOIN submission_search f ON f.rowid = s.id WHERE s.folder_path = ?",
+        (folder_path,),
+    ).fetchone()
+    if row is None:
+        return False
+    with conn:
+        conn.execute(
+            "UPDATE submission_search SET attachments = ? WHERE rowid = ?",
+            (" ".join(normalize(_attachments_text(folder_path))), row["id"]),
+        )
+    return True
+
+def sync_index(db_path: str = DEFAULT_DB) -> int:
+    """
+    Indexes stored submissions that are missing from the index.
+
+    Covers rows written outside the persistence writer (shard compaction,
+    bulk imports), databases created before the index existed, and
+    batches whose indexing failed in the writer, wherever they sit in
+    the id range. Submissions are never deleted, so equal row counts
+    mean nothing is missing; that check runs on every search, and the
+    gap scan only when the counts differ.
+
+    Returns:
+        int: Number of submissions indexed.
+    """
+    conn = _connection(db_path)
+    stored, indexed_rows = conn.execute(
+        "SELECT (SELECT COUNT(*) FROM submissions), (SELECT COUNT(*) FROM submission_search_docsize)"
+    ).fetchone()
+    if stored == indexed_rows:
+        return 0
+    # submission_search_docsize is FTS5's one-row-per-document shadow table, keyed by rowid
+    missing_sql = (
+        "SELECT s.id, s.description, s.specific_data, s.folder_path, s.cluster_macro, s.niche "
+        "FROM submissions s LEFT JOIN submission_search_docsize d ON d.id = s.id "
+        "WHERE d.id IS NULL AND s.id > ? ORDER BY s.id LIMIT ?"
+    )
+    last_id = 0
+    indexed = 0
+    while True:
+        rows = conn.execute(missing_sql, (last_id, SYNC_BATCH)).fetchall()
+        if not rows:
+            return indexed
+        index_submissions(
+            [row["id"] for row in rows],
+            [
+                {**dict(row), "specific_data": json.loads(row["specific_data"])}
+                for row in rows
+            ],
+            db_path,
+        )
+        last_id = rows[-1]["id"]
+        indexed += len(rows)
+
+def _excerpt(text: Optional[str], stems: Sequence[str], width: int = 200) -> str:
+    """A window of the original description around the first query term."""
+    if not text:
+        return ""
+    folded = fold_accents(text)  # same length as 'text' for Latin script
+    start = 0
+    if len(folded) == len(text):
+        for match in _TOKEN_RE.finditer(folded):
+            if stem(match.group()) in stems:
+                start = max(0, match.start() - width // 4)
+                break
+    excerpt = text[start:start + width].strip()
+    return ("…" if start else "") + excerpt + ("…" if start + width < len(text) else "")
+
+def search_submissions(
+    query: str,
+    clusters: Sequence[str] = (),
+    niches: Sequence[str] = (),
+    limit: int = 20,
+    offset: int = 0,
+    db_path: str = DEFAULT_DB,
+) -> List[SearchHit]:
+    """
+    Ranked full-text search over descriptions, engagement/monetization texts and PDF attachments.
+
+    Every query term must match (after folding and stemming); results are
+    ordered by BM25 with the description weighted highest. When more than
+    RANK_WINDOW submissions match, only the most recent RANK_WINDOW of
+    them are ranked, which keeps very common terms fast.
+
+    Args:
+        query (str): Free text typed by the reviewer.
+        clusters (Sequence[str]): Restrict to these cluster_macro values.
+        niches (Sequence[str]): Restrict to these niches.
+        limit (int): Page size.
+        offset (int): Results to skip.
+        db_path (str): SQLite database path.
+
+    Returns:
+        List[SearchHit]: Best matches first.
+    """
+    stems = list(dict.fromkeys(normalize(query)))
+    if not stems:
+        return []
+    sync_index(db_path)
+    conn = _connection(db_path)
+
+    match = " AND ".join(f'"{term}"' for term in stems)
+    for kind, values in (("c", clusters), ("n", niches)):
+        if values:
+            match += " AND facets:(" + " OR ".join(facet_token(kind, v) for v in values) + ")"
+
+    # Lowest rowid among the RANK_WINDOW most recent matches (None: rank them all)
+    bound = conn.execute(
+        "SELECT rowid FROM submission_search WHERE submission_search MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+        (match, RANK_WINDOW - 1),
+    ).fetchone()
+    ranked = (
+        f"SELECT rowid, bm25(submission_search, {', '.join(map(str, _WEIGHTS))}) AS score "
+        "FROM submission_search WHERE submission_search MATCH ?"
+        + (" AND rowid >= ?" if bound else "")
+        + " ORDER BY score LIMIT ? OFFSET ?"
+    )
+    params: List[Any] = [match] + ([bound[0]] if bound else []) + [limit, offset]
+    sql = (
+        "SELECT s.id, s.startup_name, s.product_name, s.cluster_macro, s.niche, s.description, r.score "
+        f"FROM ({ranked}) r JOIN submissions s ON s.id = r.rowid ORDER BY r.score"
+    )
+    return [
+        SearchHit(
+            id=row["id"], startup_name=row["startup_name"], product_name=row["product_name"],
+            cluster_macro=row["cluster_macro"], niche=row["niche"], score=round(-row["score"], 3),
+            excerpt=_excerpt(row["description"], stems),
+        )
+        for row in conn.execute(sql, params)
+    ]
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        for hit in search_submissions(" ".join(sys.argv[1:])):
+            print(f"{hit.score:8.3f}  {hit.startup_name} ({hit.cluster_macro} / {hit.niche})")
+    else:
+        print(f"{sync_index()} submissões indexadas.")
@@ -1,26 +1,41 @@
-from typing import List, Dict
+from typing import Any, List, Optional
 
-# Defines the Clusters and their respective Niches
-GROUPS_DEFINITION: Dict[str, List[str]] = {
-    "Ferramentas de Gestão e Fluxo": [
-        "Prontuário Eletrônico", "Telemedicina", "Gestão de Consultório"
-    ],
-    "Suporte à Diagnóstico e Conduta": [
-        "Dispositivo Médico", "IA Diagnóstica", 
-        "Calculadoras Clínicas", "Monitoramento Remoto"
-    ],
-    "Terapêuticas Digitais e Reabilitação": [
-        "Terapeuticas Digitais", "Realidade Virtual", "Mudança de Hábito"
-    ]
-}
+# Clusters, niches and the per-cluster questions live in taxonomy.json and are
+# served (and hot-reloaded) by taxonomy.py. Option lists that code depends on
+# stay here and are referenced from the definition file as "@NAME".
 
-# Flattens the list for the dropdown
-ALL_NICHES: List[str] = sorted([n for sublist in GROUPS_DEFINITION.values() for n in sublist])
-ALL_NICHES.append("Nicho não listado")
+# Suporte à Diagnóstico: IMDRF SaMD axes and self-declared risk class.
+# Order matters: risk.py indexes the significance x situation matrix by position.
+SD_INTENDED_USE_OPTIONS: List[str] = [
+    "Tratar ou Diagnosticar (Treat or Diagnose)",
+    "Auxiliar/Direcionar Conduta (Drive Clinical Management)",
+    "Fornecer Informação Clínica (Inform Clinical Management)"
+]
+SD_CRITICALITY_OPTIONS: List[str] = [
+    "Crítica (Risco iminente de morte ou deterioração irreversível)",
+    "Séria (Requer intervenção oportuna, mas não imediata)",
+    "Não Séria (Condição leve ou gestão de bem-estar)"
+]
+SAMD_CLASS_OPTIONS: List[str] = [
+    "Classe I (Baixo)", "Classe II (Médio)", "Classe III (Alto)", "Classe IV (Máximo)"
+]
 
-def get_cluster_from_niche(niche_name: str) -> str:
-    """Returns the macro cluster for a given niche."""
-    for cluster, niches in GROUPS_DEFINITION.items():
-        if niche_name in niches:
-            return cluster
-    return None
+# Deprecated aliases for code that still imports the taxonomy from settings.
+# They delegate to taxonomy.get_taxonomy() (so they follow hot reloads) and
+# will be removed in a later release; import from taxonomy instead.
+# taxonomy imports this module, hence the imports inside the functions.
+
+def get_cluster_from_niche(niche_name: str) -> Optional[str]:
+    """Deprecated: use taxonomy.get_cluster_from_niche."""
+    from taxonomy import get_cluster_from_niche as cluster_from_niche
+    return cluster_from_niche(niche_name)
+
+def __getattr__(name: str) -> Any:
+    """Serves GROUPS_DEFINITION and ALL_NICHES from the current taxonomy (deprecated)."""
+    if name == "GROUPS_DEFINITION":
+        from taxonomy import get_groups_definition
+        return get_groups_definition()
+    if name == "ALL_NICHES":
+        from taxonomy import get_all_niches
+        return get_all_niches()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,340 @@
+"""
+Per-replica sharded submission log with merge-on-read and compaction.
+
+Each replica appends only to its own shard file in a shared directory, so
+the hot path needs no cross-process locking. Records carry a unique
+submission_id and a log_key that is monotonic per replica:
+'<time_ns>-<replica>-<counter>'. Reading merges all shards by log_key,
+and compaction folds new shard records into the canonical SQLite store,
+JSONL backup and Excel workbook under a lock file.
+
+There is one canonical store per deployment, not one per replica: with
+BMED_SHARD_DIR set, canonical_path() places the database, JSONL and
+workbook in the shared shard directory. Every replica's compactor writes
+there, and the dashboard, search and exports read from there (through
+database.DEFAULT_DB), seeing submissions once they are compacted
+(BMED_COMPACT_INTERVAL). The volume must support POSIX locks for SQLite.
+
+Usage:
+    python submission_log.py compact
+    python submission_log.py tail -n 20
+"""
+
+import argparse
+import heapq
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl  # POSIX only; see _CompactionLock
+except ImportError:
+    fcntl = None
+
+from durable_jsonl import get_durable_writer
+
+SHARD_DIR = os.environ.get("BMED_SHARD_DIR", "")
+REPLICA_ID = os.environ.get("BMED_REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+COMPACT_INTERVAL = float(os.environ.get("BMED_COMPACT_INTERVAL", "30"))
+SHARD_PREFIX = "submissions-"
+CHECKPOINT_NAME = "compaction.json"
+LOCK_NAME = "compaction.lock"
+
+def canonical_path(filename: str, shard_dir: str = SHARD_DIR) -> str:
+    """Where a canonical store lives: inside the shared shard directory when sharding is on."""
+    if not shard_dir or os.path.isabs(filename):
+        return filename
+    return os.path.join(shard_dir, filename)
+
+# ==========================================
+# SHARD WRITER (HOT PATH, ONE PER REPLICA)
+# ==========================================
+
+class ShardWriter:
+    """Appends records to this replica's shard; only one writer per shard."""
+
+    def __init__(self, shard_dir: str = SHARD_DIR, replica_id: str = REPLICA_ID):
+        if not shard_dir:
+            raise ValueError("shard_dir é obrigatório (defina BMED_SHARD_DIR).")
+        # '-' separates log_key parts, so keep it out of the replica id
+        self.replica_id = replica_id.replace("-", "_")
+        self.path = os.path.join(shard_dir, f"{SHARD_PREFIX}{self.replica_id}.jsonl")
+        os.makedirs(shard_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writer = get_durable_writer(self.path)  # truncates a torn tail first
+        self._last_ns, self._counter = self._restore_clock()
+
+    def _restore_clock(self) -> Tuple[int, int]:
+        """Resumes after the last key on disk so keys stay monotonic across restarts."""
+        last = _last_line(self.path)
+        if last:
+            try:
+                time_ns, _, counter = json.loads(last)["log_key"].split("-")
+                return int(time_ns), int(counter)
+            except (ValueError, KeyError):
+                pass
+        return 0, 0
+
+    def _next_key(self) -> str:
+        now = time.time_ns()
+        if now > self._last_ns:
+            self._last_ns, self._counter = now, 0
+        else:
+            self._counter += 1  # clock did not advance (or went back): keep order
+        return f"{self._last_ns:020d}-{self.replica_id}-{self._counter:06d}"
+
+    def append(self, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        Stamps log_keys and appends the records with one durable write.
+
+        Returns:
+            List[str]: The log_key of each record.
+        """
+        with self._lock:
+            keys, lines = [], []
+            for data in records:
+                data["log_key"] = self._next_key()
+                keys.append(data["log_key"])
+                lines.append(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+            self._writer.append("".join(lines).encode("utf-8"))
+            return keys
+
+def _last_line(path: str) -> Optional[bytes]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 64 * 1024))
+        lines = [line for line in f.read().split(b"\n") if line.strip()]
+    return lines[-1] if lines else None
+
+# ==========================================
+# MERGE-ON-READ
+# ==========================================
+
+def list_shards(shard_dir: str = SHARD_DIR) -> List[str]:
+    if not shard_dir or not os.path.isdir(shard_dir):
+        return []
+    return sorted(
+        os.path.join(shard_dir, name) for name in os.listdir(shard_dir)
+        if name.startswith(SHARD_PREFIX) and name.endswith(".jsonl")
+    )
+
+def _iter_shard(path: str, start: int = 0) -> Iterator[Tuple[str, str, int, Dict[str, Any]]]:
+    """Yields (log_key, shard path, end offset, record) for complete lines from 'start'."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # being written by its replica; picked up next time
+            offset += len(line)
+            record = json.loads(line)
+            yield record["log_key"], path, offset, record
+
+def iter_merged(shard_dir: str = SHARD_DIR, offsets: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, str, int, Dict[str, Any]]]:
+    """
+    Merges every shard into one stream ordered by log_key.
+
+    Each shard is already sorted, so this is a k-way heap merge that holds
+    one record per shard in memory.
+    """
+    offsets = offsets or {}
+    streams = [_iter_shard(path, offsets.get(os.path.basename(path), 0)) for path in list_shards(shard_dir)]
+    return heapq.merge(*streams, key=lambda item: item[0])
+
+def iter_submissions(shard_dir: str = SHARD_DIR) -> Iterator[Dict[str, Any]]:
+    """
+    The unified, ordered view of all replicas' submissions, including
+    those not compacted yet (readers of the canonical store lag by up to
+    one compaction interval).
+    """
+    for _, _, _, record in iter_merged(shard_dir):
+        yield record
+
+# ==========================================
+# COMPACTION INTO THE CANONICAL STORE
+# ==========================================
+
+class _CompactionLock:
+    """
+    Non-blocking exclusive flock on a lock file in the shared directory.
+
+    The kernel drops the lock when its holder exits, so a crashed
+    compactor never leaves a stale lock and there is no takeover race.
+    The file itself is never removed (removing it would let two
+    processes lock two different inodes). Without fcntl (Windows) an
+    O_EXCL lock file is used instead; one left by a crash is removed by hand.
+    """
+
+    def __init__(self, shard_dir: str):
+        self.path = os.path.join(shard_dir, LOCK_NAME)
+        self.acquired = False
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "_CompactionLock":
+        if fcntl is None:
+            try:
+                self._fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                self.acquired = True
+            except FileExistsError:
+                pass
+            return self
+        self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self._fd)
+            self._fd = None
+            return self
+        os.ftruncate(self._fd, 0)
+        os.write(self._fd, f"{REPLICA_ID} {time.time()}".encode("utf-8"))
+        self.acquired = True
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._fd is None:
+            return
+        os.close(self._fd)  # releases the flock
+        if fcntl is None and self.acquired:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+def _load_checkpoint(shard_dir: str) -> Dict[str, Any]:
+    """{"offsets": {shard: byte offset}, "jsonl_size": canonical JSONL size at that point}."""
+    path = os.path.join(shard_dir, CHECKPOINT_NAME)
+    if not os.path.exists(path):
+        return {"offsets": {}, "jsonl_size": 0}
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if "offsets" not in state:  # older checkpoints held only the offsets
+        state = {"offsets": state, "jsonl_size": 0}
+    return state
+
+def _save_checkpoint(shard_dir: str, state: Dict[str, Any]) -> None:
+    path = os.path.join(shard_dir, CHECKPOINT_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def ids_appended_since(jsonl_filename: str, size: int) -> Set[str]:
+    """submission_ids already in the JSONL past 'size': appended by a run that died before its checkpoint."""
+    if not os.path.exists(jsonl_filename):
+        return set()
+    if os.path.getsize(jsonl_filename) < size:
+        size = 0  # the file was replaced; check all of it
+    ids = set()
+    with open(jsonl_filename, "rb") as f:
+        f.seek(size)
+        for line in f:
+            try:
+                submission_id = json.loads(line).get("submission_id")
+            except ValueError:
+                continue
+            if submission_id:
+                ids.add(submission_id)
+    return ids
+
+def compact(
+    shard_dir: str = SHARD_DIR,
+    db_path: Optional[str] = None,
+    jsonl_filename: str = "bmed_submissions.jsonl",
+    excel_filename: str = "bmed_startups_database.xlsx",
+    batch_size: int = 1000,
+) -> int:
+    """
+    Folds shard records not yet compacted into the canonical stores.
+
+    Only one process compacts at a time (others return 0 immediately).
+    Every store is written from the shard records past the checkpoint,
+    not from what SQLite newly inserted, so a batch whose JSONL append
+    failed is written in full by the retry. SQLite skips submission_ids it
+    already has, and the JSONL skips ids appended after the last
+    checkpoint, so a crash between a batch and its checkpoint never
+    duplicates rows. A round that appended anything asks for a workbook
+    rebuild, which runs on the rebuild schedule rather than per round.
+
+    Returns:
+        int: Number of submissions appended to the canonical JSONL.
+    """
+    from database import DEFAULT_DB, insert_submissions
+    from excel_export import get_workbook_rebuilder
+    from utils import append_to_jsonl
+
+    db_path = db_path or DEFAULT_DB
+    appended = 0
+    with _CompactionLock(shard_dir) as lock:
+        if not lock.acquired:
+            return 0
+        state = _load_checkpoint(shard_dir)
+        offsets = state["offsets"]
+        already_appended = ids_appended_since(jsonl_filename, state["jsonl_size"])
+        batch: List[Dict[str, Any]] = []
+        batch_offsets: Dict[str, int] = {}
+
+        def flush() -> int:
+            insert_submissions(batch, db_path)
+            pending = [data for data in batch if data.get("submission_id") not in already_appended]
+            append_to_jsonl(pending, jsonl_filename)
+            offsets.update(batch_offsets)
+            state["jsonl_size"] = os.path.getsize(jsonl_filename) if os.path.exists(jsonl_filename) else 0
+            _save_checkpoint(shard_dir, state)
+            return len(pending)
+
+        for _, path, end_offset, record in iter_merged(shard_dir, offsets):
+            batch.append(record)
+            batch_offsets[os.path.basename(path)] = end_offset
+            if len(batch) >= batch_size:
+                appended += flush()
+                batch, batch_offsets = [], {}
+        if batch:
+            appended += flush()
+        if appended:
+            get_workbook_rebuilder(excel_filename, jsonl_filename).request()
+    return appended
+
+def start_compactor(interval: float = COMPACT_INTERVAL, **kwargs: Any) -> threading.Thread:
+    """Runs compact() periodically in a daemon thread (every replica may run one)."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                compact(**kwargs)
+            except Exception:
+                pass  # next round retries; shards keep every record
+    thread = threading.Thread(target=loop, name="bmed-compactor", daemon=True)
+    thread.start()
+    return thread
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["compact", "tail"])
+    parser.add_argument("--shard-dir", default=SHARD_DIR or "bmed_shards")
+    parser.add_argument("-n", type=int, default=10, help="Records shown by 'tail'.")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        from database import DEFAULT_DB
+        from excel_export import get_workbook_rebuilder
+        jsonl_filename = canonical_path("bmed_submissions.jsonl", args.shard_dir)
+        excel_filename = canonical_path("bmed_startups_database.xlsx", args.shard_dir)
+        compacted = compact(
+            args.shard_dir,
+            db_path=canonical_path(os.path.basename(DEFAULT_DB), args.shard_dir),
+            jsonl_filename=jsonl_filename,
+            excel_filename=excel_filename,
+        )
+        get_workbook_rebuilder(excel_filename, jsonl_filename).flush()  # on demand: don't wait for the schedule
+        print(f"{compacted} submissões compactadas.")
+    else:
+        from collections import deque
+        for record in deque(iter_submissions(args.shard_dir), maxlen=args.n):
+            print(record["log_key"], record.get("startup_name"), record.get("cluster_macro"))
+
+if __name__ == "__main__":
+    main()
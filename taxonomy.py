@@ -0,0 +1,297 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import settings
+
+# ==========================================
+# DATA-DRIVEN TAXONOMY (CLUSTERS, NICHES, QUESTIONS)
+# ==========================================
+
+# Environment switches:
+#   BMED_TAXONOMY_FILE  versioned definition file (default: taxonomy.json next to this module)
+TAXONOMY_FILE = os.environ.get(
+    "BMED_TAXONOMY_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "taxonomy.json"),
+)
+# Compiled revisions kept in memory so sessions pinned to an older one keep rendering it
+RETAINED_REVISIONS = 8
+
+INPUT_TYPES = frozenset({"selectbox", "radio", "text_input", "text_area", "checkbox", "date_input", "file"})
+TEXT_TYPES = frozenset({"markdown", "info", "warning", "caption"})
+LAYOUT_TYPES = frozenset({"columns", "branch", "value"})
+
+class TaxonomyError(ValueError):
+    """Raised when a taxonomy definition is malformed."""
+
+@dataclass(frozen=True)
+class ClusterSchema:
+    """The question set of one cluster: expander title plus validated item tree."""
+    title: str
+    items: Tuple[Mapping[str, Any], ...]
+
+@dataclass(frozen=True)
+class Taxonomy:
+    """
+    One compiled revision of the definition file.
+
+    'revision' is the declared version plus a hash of the content, so an
+    edit that forgets to bump the version still yields a new revision.
+    """
+    revision: str
+    version: int
+    clusters: Tuple[str, ...]
+    all_niches: Tuple[str, ...]
+    unlisted_niche: str
+    niche_to_cluster: Mapping[str, str]
+    schemas: Mapping[str, ClusterSchema]
+
+    def cluster_for(self, niche_name: str) -> Optional[str]:
+        """Returns the macro cluster of a niche, or None if it is not listed."""
+        return self.niche_to_cluster.get(niche_name)
+
+    def groups(self) -> Dict[str, List[str]]:
+        """{cluster: [niches]} in definition order (the old GROUPS_DEFINITION shape)."""
+        groups: Dict[str, List[str]] = {cluster: [] for cluster in self.clusters}
+        for niche, cluster in self.niche_to_cluster.items():
+            groups[cluster].append(niche)
+        return groups
+
+# ==========================================
+# COMPILATION
+# ==========================================
+
+def _resolve_options(options: Any, where: str) -> Tuple[Any, ...]:
+    """Inline lists or '@NAME' references to option lists in settings (risk.py indexes those by position)."""
+    if isinstance(options, str) and options.startswith("@"):
+        resolved = getattr(settings, options[1:], None)
+        if not isinstance(resolved, list):
+            raise TaxonomyError(f"{where}: lista de opções desconhecida '{options}'")
+        return tuple(resolved)
+    if not isinstance(options, list) or not options:
+        raise TaxonomyError(f"{where}: 'options' deve ser uma lista não vazia ou '@NOME'")
+    return tuple(options)
+
+def _compile_items(items: Any, where: str) -> Tuple[Mapping[str, Any], ...]:
+    """Validates an item list and freezes it, resolving option references once."""
+    if not isinstance(items, list):
+        raise TaxonomyError(f"{where}: esperava uma lista de itens")
+    compiled = []
+    for position, raw in enumerate(items):
+        here = f"{where}[{position}]"
+        if not isinstance(raw, dict) or "type" not in raw:
+            raise TaxonomyError(f"{here}: item sem 'type'")
+        item = dict(raw)
+        kind = item["type"]
+        if kind in TEXT_TYPES:
+            if not isinstance(item.get("text"), str):
+                raise TaxonomyError(f"{here}: '{kind}' requer 'text'")
+        elif kind in INPUT_TYPES:
+            if not isinstance(item.get("label"), str):
+                raise TaxonomyError(f"{here}: '{kind}' requer 'label'")
+            if not (item.get("field") or item.get("name")):
+                raise TaxonomyError(f"{here}: '{kind}' requer 'field' (salvo) ou 'name' (só para ramificações)")
+            if kind in ("selectbox", "radio"):
+                item["options"] = _resolve_options(item.get("options"), here)
+            if kind == "file":
+                item["slot"] = item.get("slot") or item.get("field") or item["name"]
+                item["accept"] = tuple(item.get("accept") or ())
+        elif kind == "columns":
+            columns = item.get("items")
+            widths = item.get("widths") or [1] * len(columns or [])
+            if not isinstance(columns, list) or len(widths) != len(columns):
+                raise TaxonomyError(f"{here}: 'columns' requer 'items' (uma lista por coluna) e 'widths' do mesmo tamanho")
+            item["widths"] = tuple(widths)
+            item["items"] = tuple(_compile_items(column, f"{here}.items[{i}]") for i, column in enumerate(columns))
+        elif kind == "branch":
+            if not isinstance(item.get("on"), str):
+                raise TaxonomyError(f"{here}: 'branch' requer 'on'")
+            item["cases"] = tuple(
+                ({"in": tuple(case.get("in") or ()), "items": _compile_items(case.get("items", []), f"{here}.cases[{i}]")})
+                for i, case in enumerate(item.get("cases") or [])
+            )
+            item["default"] = _compile_items(item.get("default", []), f"{here}.default")
+        elif kind == "value":
+            if not item.get("field"):
+                raise TaxonomyError(f"{here}: 'value' requer 'field'")
+        else:
+            raise TaxonomyError(f"{here}: tipo desconhecido '{kind}'")
+        compiled.append(MappingProxyType(item))
+    return tuple(compiled)
+
+def compile_taxonomy(raw: Dict[str, Any], content_hash: str = "") -> Taxonomy:
+    """
+    Validates a parsed definition and builds its lookup maps.
+
+    Args:
+        raw (Dict): The parsed definition file.
+        content_hash (str): Hash of the file bytes, folded into the revision.
+
+    Returns:
+        Taxonomy: Compiled, immutable revision.
+
+    Raises:
+        TaxonomyError: Malformed definition (duplicate niche or cluster,
+            unknown item type, missing label...).
+    """
+    if not isinstance(raw, dict) or not isinstance(raw.get("clusters"), list) or not raw["clusters"]:
+        raise TaxonomyError("definição sem 'clusters'")
+    version = raw.get("version")
+    if not isinstance(version, int):
+        raise TaxonomyError("'version' deve ser um inteiro")
+    unlisted = raw.get("unlisted_niche", "Nicho não listado")
+
+    niche_to_cluster: Dict[str, str] = {}
+    schemas: Dict[str, ClusterSchema] = {}
+    for cluster in raw["clusters"]:
+        name = cluster.get("name") if isinstance(cluster, dict) else None
+        if not name:
+            raise TaxonomyError("cluster sem 'name'")
+        if name in schemas:
+            raise TaxonomyError(f"cluster duplicado '{name}'")
+        for niche in cluster.get("niches") or []:
+            if niche in niche_to_cluster or niche == unlisted:
+                raise TaxonomyError(f"nicho '{niche}' definido mais de uma vez")
+            niche_to_cluster[niche] = name
+        schemas[name] = ClusterSchema(
+            title=cluster.get("title") or f"Detalhes: {name}",
+            items=_compile_items(cluster.get("questions", []), name),
+        )
+
+    return Taxonomy(
+        revision=f"v{version}-{content_hash[:8]}" if content_hash else f"v{version}",
+        version=version,
+        clusters=tuple(schemas),
+        all_niches=tuple(sorted(niche_to_cluster)) + (unlisted,),
+        unlisted_niche=unlisted,
+        niche_to_cluster=MappingProxyType(niche_to_cluster),
+        schemas=MappingProxyType(schemas),
+    )
+
+def load_taxonomy(path: str = TAXONOMY_FILE) -> Taxonomy:
+    """Reads, parses and compiles a definition file."""
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        raw = json.loads(content.decode("utf-8"))
+    except ValueError as e:
+        raise TaxonomyError(f"{path}: JSON inválido ({e})") from e
+    return compile_taxonomy(raw, hashlib.sha256(content).hexdigest())
+
+# ==========================================
+# PER-PROCESS CACHE WITH HOT RELOAD
+# ==========================================
+
+class _TaxonomyCache:
+    """
+    Holds the compiled revisions of one file and reloads it when it changes.
+
+    Every lookup stats the file (a few microseconds); only a changed
+    (mtime, size) pays for a re-parse. A definition that fails to compile
+    is reported in 'last_error' and the previous revision stays active, so
+    a bad edit never takes the form down.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._current: Optional[Taxonomy] = None
+        self._revisions: "OrderedDict[str, Taxonomy]" = OrderedDict()
+        self.last_error: Optional[str] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def current(self) -> Taxonomy:
+        signature = self._stat()
+        current = self._current
+        if current is not None and signature == self._signature:
+            return current
+        with self._lock:
+            if self._current is not None and signature == self._signature:
+                return self._current
+            try:
+                loaded = load_taxonomy(self.path)
+            except (OSError, TaxonomyError) as e:
+                if self._current is None:
+                    raise
+                self.last_error = str(e)
+                # Remember the signature so a broken file is not re-parsed on every call
+                self._signature = signature
+                return self._current
+            self.last_error = None
+            self._signature = signature
+            self._current = loaded
+            self._revisions[loaded.revision] = loaded
+            self._revisions.move_to_end(loaded.revision)
+            while len(self._revisions) > RETAINED_REVISIONS:
+                self._revisions.popitem(last=False)
+            return loaded
+
+    def get(self, revision: Optional[str] = None) -> Taxonomy:
+        current = self.current()
+        if revision is None or revision == current.revision:
+            return current
+        return self._revisions.get(revision, current)
+
+_CACHES: Dict[str, _TaxonomyCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+def _cache_for(path: str) -> _TaxonomyCache:
+    path = os.path.abspath(path)
+    cache = _CACHES.get(path)
+    if cache is None:
+        with _CACHES_LOCK:
+            cache = _CACHES.setdefault(path, _TaxonomyCache(path))
+    return cache
+
+def get_taxonomy(revision: Optional[str] = None, path: str = TAXONOMY_FILE) -> Taxonomy:
+    """
+    Returns the compiled taxonomy, reloading the file if it changed on disk.
+
+    Args:
+        revision (Optional[str]): Revision a session started with. While it
+            is still retained, that revision is returned instead of the
+            newest, so a form in progress keeps its questions across a reload.
+        path (str): Definition file.
+
+    Returns:
+        Taxonomy: The requested (or current) revision.
+    """
+    return _cache_for(path).get(revision)
+
+def taxonomy_error(path: str = TAXONOMY_FILE) -> Optional[str]:
+    """The error of the last failed reload, or None while the file on disk is the active revision."""
+    return _cache_for(path).last_error
+
+def get_cluster_from_niche(niche_name: str) -> Optional[str]:
+    """Returns the macro cluster for a given niche."""
+    return get_taxonomy().niche_to_cluster.get(niche_name)
+
+def get_all_niches() -> List[str]:
+    """Niches for the dropdown: sorted, with the 'not listed' option last."""
+    return list(get_taxonomy().all_niches)
+
+def get_groups_definition() -> Dict[str, List[str]]:
+    """{cluster: [niches]} as currently defined."""
+    return get_taxonomy().groups()
+
+if __name__ == "__main__":
+    import sys
+    target = sys.argv[1] if len(sys.argv) > 1 else TAXONOMY_FILE
+    try:
+        taxonomy = load_taxonomy(target)
+    except (OSError, TaxonomyError) as e:
+        print(f"Definição inválida: {e}")
+        sys.exit(1)
+    print(f"Taxonomia {taxonomy.revision}: {len(taxonomy.clusters)} clusters, {len(taxonomy.niche_to_cluster)} nichos.")
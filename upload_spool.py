@@ -0,0 +1,215 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import streamlit as st
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from streamlit.runtime.memory_uploaded_file_manager import MemoryUploadedFileManager
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# ==========================================
+# DISK SPOOL FOR UPLOADS (BOUNDED MEMORY)
+# ==========================================
+# Streamlit keeps every st.file_uploader upload in its MemoryUploadedFileManager
+# until the browser sends a DELETE or the session ends; resetting the widget
+# alone frees nothing. So as soon as a file arrives it is copied to disk and
+# removed from the manager explicitly (as st.chat_input does with its own
+# files); session_state keeps only a SpooledUpload handle. Environment overrides:
+#   BMED_UPLOAD_MAX_FILE_MB       per-file limit
+#   BMED_UPLOAD_MAX_SESSION_MB    total spooled per session
+#   BMED_UPLOAD_MEMORY_BUDGET_MB  received upload bytes not yet moved to disk, all sessions
+#   BMED_SPOOL_TTL_HOURS          idle time before a session spool is collected
+
+MB = 1024 * 1024
+MAX_FILE_BYTES = int(float(os.environ.get("BMED_UPLOAD_MAX_FILE_MB", "100")) * MB)
+MAX_SESSION_BYTES = int(float(os.environ.get("BMED_UPLOAD_MAX_SESSION_MB", "300")) * MB)
+MEMORY_BUDGET_BYTES = int(float(os.environ.get("BMED_UPLOAD_MEMORY_BUDGET_MB", "512")) * MB)
+SPOOL_TTL_SECONDS = float(os.environ.get("BMED_SPOOL_TTL_HOURS", "12")) * 3600
+SPOOL_ROOT = os.path.join("Submissoes", "_spool")
+CHUNK_SIZE = 1024 * 1024
+BUDGET_WAIT_SECONDS = 5.0
+GC_INTERVAL_SECONDS = 600.0
+
+@dataclass
+class SpooledUpload:
+    """Handle to an upload already on disk. Exposes .name like UploadedFile."""
+    name: str
+    path: str
+    size: int
+
+class _MemoryBudget:
+    """
+    Counts received upload bytes still held in memory across all sessions.
+
+    The bytes are already in the upload manager when the callback runs, so
+    the budget cannot refuse them at the door; it caps how many of them are
+    in flight to disk at once, and a refused file is dropped right away.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.used + amount > self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.used += amount
+            return True
+
+    def release(self, amount: int) -> None:
+        with self._cond:
+            self.used -= amount
+            self._cond.notify_all()
+
+_budget = _MemoryBudget(MEMORY_BUDGET_BYTES)
+_last_gc = 0.0
+_gc_lock = threading.Lock()
+
+def _session_dir() -> str:
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx is not None else "local"
+    return os.path.join(SPOOL_ROOT, session_id)
+
+def _handles() -> Dict[str, SpooledUpload]:
+    if "_spooled_uploads" not in st.session_state:
+        st.session_state._spooled_uploads = {}
+    return st.session_state._spooled_uploads
+
+def _spool(uploaded_file, session_dir: str) -> SpooledUpload:
+    """Streams an UploadedFile into the session spool directory."""
+    os.makedirs(session_dir, exist_ok=True)
+    os.utime(session_dir)  # marks the session as active for the GC
+    fd, path = tempfile.mkstemp(dir=session_dir, suffix=os.path.splitext(uploaded_file.name)[1])
+    uploaded_file.seek(0)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = uploaded_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return SpooledUpload(name=uploaded_file.name, path=path, size=os.path.getsize(path))
+
+def _drop_from_upload_manager(uploaded_file) -> None:
+    """Frees Streamlit's in-memory copy of an upload (only the memory manager supports it)."""
+    ctx = get_script_run_ctx()
+    if ctx is not None and isinstance(ctx.uploaded_file_mgr, MemoryUploadedFileManager):
+        ctx.uploaded_file_mgr.remove_file(session_id=ctx.session_id, file_id=uploaded_file.file_id)
+
+def _on_upload(slot: str, widget_key: str) -> None:
+    """Widget callback: checks limits, spools the file, frees the upload and resets the uploader."""
+    uploaded_file = st.session_state.get(widget_key)
+    if uploaded_file is None:
+        return
+    handles = _handles()
+    size = uploaded_file.size
+    others = sum(h.size for s, h in handles.items() if s != slot)
+
+    error = None
+    if size > MAX_FILE_BYTES:
+        error = f"Arquivo acima do limite de {MAX_FILE_BYTES // MB} MB."
+    elif others + size > MAX_SESSION_BYTES:
+        error = f"Total de anexos acima do limite de {MAX_SESSION_BYTES // MB} MB por submissão."
+    elif not _budget.acquire(size, BUDGET_WAIT_SECONDS):
+        error = "Servidor ocupado recebendo arquivos. Tente anexar novamente em instantes."
+    else:
+        try:
+            discard_spooled(slot)
+            handles[slot] = _spool(uploaded_file, _session_dir())
+        except OSError as e:
+            error = f"Erro ao receber arquivo: {e}"
+        finally:
+            _budget.release(size)
+
+    # Spooled or refused, the upload leaves memory now rather than at session end
+    _drop_from_upload_manager(uploaded_file)
+    if error:
+        st.session_state[f"_spool_error_{slot}"] = error
+    # A new widget key drops the old widget (and its UploadedFile in session_state)
+    st.session_state[f"_spool_version_{slot}"] = st.session_state.get(f"_spool_version_{slot}", 0) + 1
+    collect_abandoned_spools()
+
+def discard_spooled(slot: str) -> None:
+    """Removes a slot's spooled file, if any."""
+    handle = _handles().pop(slot, None)
+    if handle is not None and os.path.exists(handle.path):
+        os.remove(handle.path)
+
+def spooled_file_uploader(label: str, slot: str, type: Optional[List[str]] = None, help: Optional[str] = None) -> Optional[SpooledUpload]:
+    """
+    Drop-in for st.file_uploader that keeps the upload on disk.
+
+    Args:
+        label (str): Widget label.
+        slot (str): Stable identifier of this attachment within the session.
+        type (List[str]): Allowed extensions, as in st.file_uploader.
+
+    Returns:
+        Optional[SpooledUpload]: Handle to the spooled file, or None.
+    """
+    handle = _handles().get(slot)
+    if handle is not None and os.path.exists(handle.path):
+        col_file, col_btn = st.columns([4, 1])
+        with col_file:
+            st.success(f"{label}: **{handle.name}** ({handle.size / MB:.1f} MB)")
+        with col_btn:
+            st.button("Remover", key=f"_spool_remove_{slot}", on_click=discard_spooled, args=(slot,))
+        return handle
+
+    widget_key = f"_upload_{slot}_{st.session_state.get(f'_spool_version_{slot}', 0)}"
+    st.file_uploader(label, type=type, help=help, key=widget_key, on_change=_on_upload, args=(slot, widget_key))
+    error = st.session_state.pop(f"_spool_error_{slot}", None)
+    if error:
+        st.error(error)
+    return None
+
+def get_spooled(slot: str) -> Optional[SpooledUpload]:
+    """Returns the handle spooled for a slot in this session, if any."""
+    handle = _handles().get(slot)
+    if handle is not None and os.path.exists(handle.path):
+        return handle
+    return None
+
+def release_session_spool() -> None:
+    """Forgets every handle and deletes this session's spool (after a submission)."""
+    _handles().clear()
+    shutil.rmtree(_session_dir(), ignore_errors=True)
+
+def collect_abandoned_spools(ttl_seconds: float = SPOOL_TTL_SECONDS) -> int:
+    """
+    Deletes session spools idle for longer than the TTL.
+
+    Runs at most every GC_INTERVAL_SECONDS per process, piggybacking on uploads.
+
+    Returns:
+        int: Number of session directories removed.
+    """
+    global _last_gc
+    now = time.time()
+    with _gc_lock:
+        if now - _last_gc < GC_INTERVAL_SECONDS:
+            return 0
+        _last_gc = now
+    removed = 0
+    if not os.path.isdir(SPOOL_ROOT):
+        return removed
+    for entry in os.scandir(SPOOL_ROOT):
+        try:
+            if entry.is_dir() and now - entry.stat().st_mtime > ttl_seconds:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            pass
+    return removed
@@ -1,18 +1,44 @@
 import os
 import re
 import json
-import pandas as pd
 import streamlit as st
-from datetime import datetime
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+
+from metrics import timed, add_bytes
+from blob_store import MANIFEST_NAME, adopt_file, store_blob, link_blob, record_in_manifest
+from upload_spool import SpooledUpload
+from durable_jsonl import get_durable_writer
+from taxonomy import get_taxonomy, get_cluster_from_niche
 
 # ==========================================
 # FILE OPERATIONS
 # ==========================================
 
+# Shared pool for attachment I/O; uploads are disk-bound, so a few threads suffice
+_UPLOAD_POOL = ThreadPoolExecutor(max_workers=5, thread_name_prefix="bmed-uploads")
+
+def _store_uploaded_file(uploaded_file, folder_path: str) -> str:
+    """Stores one upload (in memory or already spooled to disk) and links it into the folder. Raises on failure."""
+    with timed("save_uploaded_file"):
+        os.makedirs(folder_path, exist_ok=True)
+        if isinstance(uploaded_file, SpooledUpload):
+            digest, size, stored_blob = adopt_file(uploaded_file.path)
+        else:
+            digest, size, stored_blob = store_blob(uploaded_file)
+        add_bytes("uploads", size)
+        file_path = os.path.join(folder_path, uploaded_file.name)
+        link_blob(stored_blob, file_path)
+        record_in_manifest(folder_path, uploaded_file.name, digest, size)
+    return file_path
+
 def save_uploaded_file(uploaded_file, folder_path: str) -> Optional[str]:
     """
     Saves an uploaded file to the specified directory.
+
+    The content is streamed into the content-addressed blob store (stored
+    once per SHA-256) and linked into the folder under its original name;
+    the folder's manifest.json records which blob each filename maps to.
     
     Args:
         uploaded_file: The file object from Streamlit uploader.
@@ -23,16 +49,54 @@ def save_uploaded_file(uploaded_file, folder_path: str) -> Optional[str]:
     """
     if uploaded_file is not None:
         try:
-            os.makedirs(folder_path, exist_ok=True)
-            file_path = os.path.join(folder_path, uploaded_file.name)
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            return file_path
+            return _store_uploaded_file(uploaded_file, folder_path)
         except Exception as e:
             st.error(f"Erro ao salvar arquivo: {e}")
             return None
     return None
 
+def _discard_submission_files(file_paths: List[str], folder_path: str) -> None:
+    """Removes files written for an aborted submission (blobs are kept, they may be shared)."""
+    for file_path in file_paths + [os.path.join(folder_path, MANIFEST_NAME)]:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+    try:
+        os.rmdir(folder_path)
+    except OSError:
+        pass
+
+def save_uploaded_files(uploaded_files: List[Any], folder_path: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Saves several uploads concurrently on the shared upload pool.
+
+    All-or-nothing: if any file fails, the ones already written are removed.
+
+    Args:
+        uploaded_files (List): Streamlit UploadedFile objects (None entries are skipped).
+        folder_path (str): Destination directory path.
+
+    Returns:
+        Tuple[Dict[str, str], Dict[str, str]]: ({filename: saved path}, {filename: error message}).
+        The first dict is empty whenever the second is not.
+    """
+    futures = [
+        (f.name, _UPLOAD_POOL.submit(_store_uploaded_file, f, folder_path))
+        for f in uploaded_files if f is not None
+    ]
+    saved, errors = {}, {}
+    for name, future in futures:
+        try:
+            saved[name] = future.result()
+        except Exception as e:
+            errors[name] = str(e)
+
+    if errors:
+        _discard_submission_files(list(saved.values()), folder_path)
+        saved = {}
+    return saved, errors
+
 # ==========================================
 # VALIDATION
 # ==========================================
@@ -51,71 +115,89 @@ def validate_email(email: str) -> bool:
     pattern = r"^[\w\.-]+@[\w\.-]+\.\w+$"
     return re.match(pattern, email) is not None
 
+def validate_general_data(data: Dict[str, Any]) -> Tuple[List[str], Optional[str]]:
+    """
+    Applies the Step 1 rules to a submission and resolves its macro cluster.
+
+    Shared by the form (validate_step_1) and bulk imports, so both accept
+    exactly the same records.
+
+    Args:
+        data (Dict): Needs 'startup_name', 'email' and 'niche'; for the
+            unlisted niche, 'cluster_macro' holds the manually chosen group.
+
+    Returns:
+        Tuple[List[str], Optional[str]]: (error messages, resolved cluster).
+        The cluster is None whenever there are errors.
+    """
+    taxonomy = get_taxonomy()
+    errors = []
+    if not data.get("startup_name"):
+        errors.append("Nome da Startup é obrigatório.")
+    if not data.get("email"):
+        errors.append("E-mail é obrigatório.")
+    elif not validate_email(data["email"]):
+        errors.append("E-mail com formato inválido.")
+
+    niche = data.get("niche")
+    cluster = None
+    if not niche:
+        errors.append("Nicho é obrigatório.")
+    elif niche == taxonomy.unlisted_niche:
+        cluster = data.get("cluster_macro")
+        if not cluster:
+            errors.append("Selecione o Grupo Macro para nicho não listado.")
+        elif cluster not in taxonomy.schemas:
+            errors.append(f"Grupo Macro desconhecido: {cluster}.")
+    else:
+        cluster = get_cluster_from_niche(niche)
+        if cluster is None:
+            errors.append(f"Nicho desconhecido: {niche}.")
+    return errors, (None if errors else cluster)
+
 # ==========================================
 # DATA PERSISTENCE (JSONL + EXCEL)
 # ==========================================
 
+def append_to_jsonl(records: List[Dict[str, Any]], filename: str = "bmed_submissions.jsonl") -> None:
+    """
+    Appends several dictionaries as JSON lines and returns once they are durable.
+
+    The write goes through the file's group-commit writer, so concurrent
+    callers share one write + fsync instead of paying one each.
+
+    Raises:
+        Exception: Any I/O or serialization error; callers decide how to report it.
+    """
+    if not records:
+        return
+    # Serialize everything first so a bad record never leaves a partial batch behind
+    with timed("save_to_jsonl"):
+        payload = "".join(json.dumps(data, ensure_ascii=False, default=str) + "\n" for data in records)
+        get_durable_writer(filename).append(payload.encode("utf-8"))
+
 def save_to_jsonl(data: Dict[str, Any], filename: str = "bmed_submissions.jsonl") -> bool:
     """
     Appends a dictionary as a JSON line to a file.
     Preferred for raw data backup.
     """
     try:
-        with open(filename, "a", encoding="utf-8") as f:
-            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        append_to_jsonl([data], filename)
         return True
     except Exception as e:
         st.error(f"Erro ao salvar backup JSONL: {e}")
         return False
 
-def save_to_excel_db(data: Dict[str, Any], filename: str = "bmed_startups_database.xlsx") -> bool:
-    """
-    Saves submission data to an Excel file, separating by Cluster (Sheet).
-    
-    Args:
-        data (Dict): The flat or nested dictionary of submission data.
-        filename (str): The Excel filename.
-    
-    Returns:
-        bool: True if successful.
-    """
-    try:
-        # 1. Flatten Data: Merge specific_data into main dict for tabular format
-        flat_data = data.copy()
-        specific = flat_data.pop('specific_data', {})
-        flat_data.update(specific)
-        
-        # 2. Identify Target Sheet (Cluster)
-        # Use a safe default if cluster is missing
-        cluster_name = flat_data.get('cluster_macro', 'Outros')
-        # Excel sheet names have limits (31 chars). Truncate if needed.
-        sheet_name = cluster_name[:31] 
-
-        # 3. Create DataFrame for current entry
-        new_df = pd.DataFrame([flat_data])
-
-        # 4. Load or Create Workbook logic
-        if os.path.exists(filename):
-            # Load existing excel file
-            # We need to use openpyxl engine to not overwrite other sheets
-            # But pandas 'ExcelWriter' with mode='a' is the pythonic way
-            with pd.ExcelWriter(filename, engine='openpyxl', mode='a', if_sheet_exists='overlay') as writer:
-                # Check if sheet exists to append properly
-                try:
-                    # Try to load existing sheet to get headers and append
-                    existing_df = pd.read_excel(filename, sheet_name=sheet_name)
-                    combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-                    combined_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                except ValueError:
-                    # Sheet doesn't exist yet, simply write it
-                    new_df.to_excel(writer, sheet_name=sheet_name, index=False)
-        else:
-            # Create new file
-            with pd.ExcelWriter(filename, engine='openpyxl', mode='w') as writer:
-                new_df.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        return True
+def _flatten_submission(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Merges specific_data into the main dict for tabular format."""
+    flat_data = data.copy()
+    specific = flat_data.pop('specific_data', {}) or {}
+    flat_data.update(specific)
+    return flat_data
 
-    except Exception as e:
-        st.error(f"Erro ao atualizar planilha Excel: {e}")
-        return False
+def _sheet_name_for(flat_data: Dict[str, Any]) -> str:
+    """Returns the target sheet (Cluster) for a flattened row."""
+    # Use a safe default if cluster is missing
+    cluster_name = flat_data.get('cluster_macro') or 'Outros'
+    # Excel sheet names have limits (31 chars). Truncate if needed.
+    return cluster_name[:31]